@@ -0,0 +1,342 @@
+"""
+Arrears from backdated pay changes
+
+A pay change effective in the past is applied by recalculating every
+stored payroll period that ends on or after the effective date, using the
+inputs saved with each period, and summing what should have been paid less
+what was paid. The period the change falls in is paid at the old rate up
+to the effective date and the new rate after it. All affected periods of
+the whole workforce are recalculated together, one array pass per rule
+version.
+
+Periods paid on cumulative year-to-date PAYE are recalculated the same
+way, running on from the totals stored before the first affected period,
+so PAYE arrears come from the pay change alone and not from comparing
+annualised PAYE with cumulative PAYE.
+
+Arrears are recorded per period, and the stored history counts them as
+paid for that period, so a period changed twice is only paid the remaining
+difference the second time.
+"""
+import numpy as np
+import pandas as pd
+
+from business_calendar import to_days
+from salary_calculator import round_money
+from ytd_paye import calculate_cumulative_paye
+
+# Amounts compared between the stored and recalculated periods:
+# payroll_details column -> calculator output column
+ARREARS_AMOUNTS = {
+    'gross_pay': 'PRORATED_MONTHLY_GROSS',
+    'pension_employee': 'MANDATORY_PENSION',
+    'pension_employer': 'EMPLOYER_PENSION',
+    'paye_tax': 'PAYE_TAX',
+    'net_pay': 'NET_PAY',
+    'taxable_pay': 'TAXABLE_PAY',
+}
+
+# Per-employee arrears fields, as stored in payroll_arrears
+ARREARS_FIELDS = ['periods'] + list(ARREARS_AMOUNTS)
+
+# Columns of the stored history, as from get_payroll_history
+HISTORY_COLUMNS = [
+    'run_id', 'employee_id', 'period_id', 'period_start', 'period_end', 'contract_type',
+    'employee_start_date', 'annual_gross_pay', 'working_days_ratio', 'gross_pay', 'net_pay',
+    'pension_employee', 'pension_employer', 'pension_voluntary', 'paye_tax',
+    'other_deductions', 'reimbursements', 'taxable_pay', 'tax_period',
+    'previous_taxable', 'previous_tax'
+]
+
+
+def affected_periods(history, changes):
+    """
+    Stored periods touched by each pay change.
+
+    Args:
+        history (pd.DataFrame): Stored payroll details, as from get_payroll_history
+        changes (pd.DataFrame): 'employee_id', 'effective_date' and 'new_annual_gross'
+
+    Returns:
+        pd.DataFrame: The latest stored run of each employee and period ending
+            on or after the employee's effective date, with the change merged in
+    """
+    periods = history.sort_values('run_id').drop_duplicates(['employee_id', 'period_id'], keep='last')
+    periods = periods.merge(changes, on='employee_id', how='inner')
+    return periods[to_days(periods['period_end']) >= to_days(periods['effective_date'])].reset_index(drop=True)
+
+
+def cumulative_paye(calculator, periods, taxable_pay, annualised_paye):
+    """
+    PAYE of recalculated periods, on the basis each period was paid on.
+
+    Periods paid on cumulative PAYE (with a stored tax_period) are worked
+    through in order within each employee's tax year. The first starts from
+    the year-to-date totals stored before it, and each later one from those
+    plus the recalculated taxable pay and PAYE of the periods before it,
+    with one array pass per position in the sequence. Other periods keep
+    annualised PAYE.
+
+    Args:
+        calculator (SalaryCalculator): Calculator with the rule book
+        periods (pd.DataFrame): Output of affected_periods
+        taxable_pay (np.ndarray): Recalculated taxable pay of each period
+        annualised_paye (np.ndarray): Recalculated annualised PAYE of each period
+
+    Returns:
+        np.ndarray: PAYE of each period
+    """
+    paye_tax = np.array(annualised_paye, dtype=float)
+    tax_period = periods['tax_period'].to_numpy(dtype=float)
+    cumulative = np.flatnonzero(~np.isnan(tax_period))
+    if not len(cumulative):
+        return paye_tax
+
+    # Cumulative periods in order within each employee and tax year
+    period_end = to_days(periods['period_end'])
+    order = np.lexsort((
+        period_end[cumulative],
+        period_end[cumulative].astype('datetime64[Y]'),
+        periods['employee_id'].to_numpy()[cumulative]
+    ))
+    rows = cumulative[order]
+    keys = pd.DataFrame({
+        'employee_id': periods['employee_id'].to_numpy()[rows],
+        'tax_year': period_end[rows].astype('datetime64[Y]')
+    })
+    position = keys.groupby(['employee_id', 'tax_year']).cumcount().to_numpy()
+
+    taxable_before = periods['previous_taxable'].to_numpy(dtype=float)[rows]
+    tax_before = periods['previous_tax'].to_numpy(dtype=float)[rows]
+    versions = calculator.rule_book.version_indices(period_end[rows])
+    tax = np.zeros(len(rows))
+    for step in range(position.max() + 1):
+        at = np.flatnonzero(position == step)
+        if step:
+            taxable_before[at] = round_money(taxable_before[at - 1] + taxable_pay[rows[at - 1]])
+            tax_before[at] = round_money(tax_before[at - 1] + tax[at - 1])
+        for version in np.unique(versions[at]):
+            block = at[versions[at] == version]
+            tax[block] = calculate_cumulative_paye(
+                calculator.rule_book.versions[version].tax_table, taxable_pay[rows[block]],
+                tax_period[rows[block]], taxable_before[block], tax_before[block]
+            )
+
+    paye_tax[rows] = tax
+    return paye_tax
+
+
+def recalculate_periods(calculator, periods):
+    """
+    Recalculate stored periods at the new pay.
+
+    Periods saved before the annual gross and working-days ratio were
+    stored fall back to the ratio from the employee's start date and the
+    annual gross implied by the stored gross pay. PAYE is worked out the
+    way each period was paid, as in cumulative_paye, and taxable pay not
+    stored with older periods is recalculated at the old pay.
+
+    Args:
+        calculator (SalaryCalculator): Calculator with the employees' components and rules
+        periods (pd.DataFrame): Output of affected_periods
+
+    Returns:
+        pd.DataFrame: periods with a 'recalculated_<column>' and
+            'difference_<column>' column for each amount in ARREARS_AMOUNTS
+    """
+    period_start = to_days(periods['period_start'])
+    period_end = to_days(periods['period_end'])
+
+    stored_ratio = periods['working_days_ratio'].to_numpy(dtype=float)
+    fallback_ratio = calculator.calculate_working_days_ratios(
+        np.maximum(to_days(periods['employee_start_date']), period_start), period_end
+    )
+    working_ratio = np.where(np.isnan(stored_ratio), fallback_ratio, stored_ratio)
+
+    gross_pay = periods['gross_pay'].to_numpy(dtype=float)
+    stored_annual = periods['annual_gross_pay'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        implied_annual = np.where(working_ratio > 0, gross_pay / working_ratio * 12, 0.0)
+    old_annual = np.where(np.isnan(stored_annual), implied_annual, stored_annual)
+    new_annual = periods['new_annual_gross'].to_numpy(dtype=float)
+
+    # Share of the days worked in the period that fall on or after the effective date
+    worked_days = working_ratio * calculator.calendar.month_business_days(period_end)
+    new_days = calculator.calendar.business_days_between(
+        np.maximum(to_days(periods['effective_date']), period_start), period_end
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        new_share = np.clip(np.where(worked_days > 0, new_days / worked_days, 1.0), 0.0, 1.0)
+    annual_gross = old_annual + (new_annual - old_annual) * new_share
+
+    inputs = [
+        working_ratio,
+        calculator._contract_mask(periods['contract_type']),
+        periods['pension_voluntary'].to_numpy(dtype=float),
+        periods['reimbursements'].to_numpy(dtype=float),
+        periods['other_deductions'].to_numpy(dtype=float)
+    ]
+    columns = calculator.calculate_columns_for_dates(period_end, annual_gross, *inputs)
+
+    # PAYE on the basis each period was paid on, and the net pay that follows
+    columns['PAYE_TAX'] = cumulative_paye(calculator, periods, columns['TAXABLE_PAY'], columns['PAYE_TAX'])
+    columns['NET_PAY'] = round_money(
+        columns['PRORATED_MONTHLY_GROSS']
+        - round_money(columns['PAYE_TAX'] + columns['MANDATORY_PENSION']
+                      + columns['VOLUNTARY_PENSION'] + columns['OTHER_DEDUCTIONS'])
+        + columns['REIMBURSEMENTS']
+    )
+
+    stored_amounts = periods[list(ARREARS_AMOUNTS)].astype(float)
+    if stored_amounts['taxable_pay'].isna().any():
+        old_columns = calculator.calculate_columns_for_dates(period_end, old_annual, *inputs)
+        stored_amounts['taxable_pay'] = stored_amounts['taxable_pay'].fillna(
+            pd.Series(old_columns['TAXABLE_PAY'], index=stored_amounts.index)
+        )
+
+    recalculated = periods.copy()
+    for stored, column in ARREARS_AMOUNTS.items():
+        recalculated[f'recalculated_{stored}'] = columns[column]
+        recalculated[f'difference_{stored}'] = round_money(
+            columns[column] - stored_amounts[stored].to_numpy()
+        )
+    return recalculated
+
+
+def period_arrears(calculator, history, changes):
+    """
+    Arrears owed for each stored period touched by backdated pay changes.
+
+    Args:
+        calculator (SalaryCalculator): Calculator with the employees' components and rules
+        history (pd.DataFrame): Stored payroll details, as from get_payroll_history
+        changes (pd.DataFrame): 'employee_id', 'effective_date' and 'new_annual_gross'
+
+    Returns:
+        pd.DataFrame: One row per employee and period with 'employee_id',
+            'period_id', 'effective_date', 'new_annual_gross' and the
+            difference for each amount in ARREARS_AMOUNTS
+    """
+    columns = ['employee_id', 'period_id', 'effective_date', 'new_annual_gross']
+    periods = affected_periods(history, changes)
+    if periods.empty:
+        return pd.DataFrame(columns=columns + list(ARREARS_AMOUNTS))
+
+    recalculated = recalculate_periods(calculator, periods)
+    arrears = recalculated[columns].copy()
+    for stored in ARREARS_AMOUNTS:
+        arrears[stored] = recalculated[f'difference_{stored}'].to_numpy()
+    return arrears
+
+
+def arrears_totals(changes, periods):
+    """
+    Total arrears owed to each changed employee.
+
+    Args:
+        changes (pd.DataFrame): 'employee_id', 'effective_date' and 'new_annual_gross'
+        periods (pd.DataFrame): Output of period_arrears
+
+    Returns:
+        pd.DataFrame: One row per changed employee, indexed by employee_id,
+            with the change and ARREARS_FIELDS; employees with no stored
+            periods since the effective date owe nothing
+    """
+    arrears = changes.set_index('employee_id')[['effective_date', 'new_annual_gross']].copy()
+    for field in ARREARS_FIELDS:
+        arrears[field] = 0 if field == 'periods' else 0.0
+
+    if periods.empty:
+        return arrears
+
+    totals = periods.groupby('employee_id').agg(
+        periods=('period_id', 'size'),
+        **{stored: (stored, 'sum') for stored in ARREARS_AMOUNTS}
+    )
+    arrears.loc[totals.index, 'periods'] = totals['periods']
+    for stored in ARREARS_AMOUNTS:
+        arrears.loc[totals.index, stored] = round_money(totals[stored].to_numpy(dtype=float))
+    return arrears
+
+
+def calculate_arrears(calculator, history, changes):
+    """
+    Arrears owed to each employee for backdated pay changes.
+
+    Args:
+        calculator (SalaryCalculator): Calculator with the employees' components and rules
+        history (pd.DataFrame): Stored payroll details, as from get_payroll_history
+        changes (pd.DataFrame): 'employee_id', 'effective_date' and 'new_annual_gross'
+
+    Returns:
+        pd.DataFrame: Output of arrears_totals
+    """
+    return arrears_totals(changes, period_arrears(calculator, history, changes))
+
+
+def arrears_frame(records):
+    """
+    Align pending arrears with payroll results.
+
+    Args:
+        records (list): One dict of ARREARS_AMOUNTS totals, or None, per result row
+
+    Returns:
+        pd.DataFrame: ARREARS_AMOUNTS columns, zeros where there is nothing owed
+    """
+    return pd.DataFrame(
+        [[(record or {}).get(field, 0.0) for field in ARREARS_AMOUNTS] for record in records],
+        columns=list(ARREARS_AMOUNTS), dtype=float
+    )
+
+
+def apply_arrears(results, arrears):
+    """
+    Add arrears lines to a payroll run's results.
+
+    Args:
+        results (pd.DataFrame): Output of process_dataframe
+        arrears (pd.DataFrame): Aligned row for row, as from arrears_frame
+
+    Returns:
+        pd.DataFrame: results with ARREARS_<AMOUNT> columns added and gross pay,
+            pension, taxable pay, PAYE, deductions and net pay including the
+            arrears, so gross less deductions still reconciles to net pay
+    """
+    adjusted = results.copy()
+    for stored in ARREARS_AMOUNTS:
+        adjusted[f'ARREARS_{stored.upper()}'] = arrears[stored].to_numpy()
+
+    for stored in ['gross_pay', 'pension_employee', 'pension_employer', 'taxable_pay', 'paye_tax']:
+        column = ARREARS_AMOUNTS[stored]
+        adjusted[column] = round_money(adjusted[column].to_numpy(dtype=float) + arrears[stored].to_numpy())
+
+    adjusted['TOTAL_DEDUCTIONS'] = round_money(
+        adjusted['TOTAL_DEDUCTIONS'].to_numpy(dtype=float)
+        + arrears['pension_employee'].to_numpy() + arrears['paye_tax'].to_numpy()
+    )
+    adjusted['NET_PAY'] = round_money(adjusted['NET_PAY'].to_numpy(dtype=float) + arrears['net_pay'].to_numpy())
+    return adjusted
+
+
+def apply_arrears_ytd(ytd, employee_ids, arrears):
+    """
+    Add arrears paid in a run to the year-to-date totals after it.
+
+    Args:
+        ytd (pd.DataFrame): Running totals after the run, as from apply_ytd_paye
+        employee_ids (list): Employee of each arrears row
+        arrears (pd.DataFrame): Arrears paid, as from arrears_frame
+
+    Returns:
+        pd.DataFrame: ytd with the arrears gross, relief, taxable pay and PAYE
+            added, so later periods run on from what was actually paid
+    """
+    paid = arrears.set_axis(pd.Index(employee_ids, name='employee_id')).reindex(ytd.index, fill_value=0.0)
+    relief = paid['gross_pay'] - paid['taxable_pay']
+
+    updated = ytd.copy()
+    for field, amount in [('cumulative_gross', paid['gross_pay']), ('cumulative_relief', relief),
+                          ('cumulative_taxable', paid['taxable_pay']), ('cumulative_tax', paid['paye_tax'])]:
+        updated[field] = round_money(updated[field].to_numpy(dtype=float) + amount.to_numpy(dtype=float))
+    return updated
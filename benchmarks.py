@@ -0,0 +1,196 @@
+"""
+Throughput benchmarks for the salary calculator
+
+Run from the project directory:
+
+    python benchmarks.py --output bench.json
+    python benchmarks.py --sizes 1000 10000 --compare bench.json
+
+Results are written as JSON so runs can be compared for regressions.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from salary_calculator import SalaryCalculator, DEFAULT_COMPONENTS
+from workforce_generator import generate_workforce
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+DEFAULT_REPEATS = 3
+
+# Scalar methods are timed over at most this many calls per size
+DEFAULT_SCALAR_LIMIT = 100000
+
+# Drop in throughput, as a fraction of the baseline, reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+
+def _time(function, repeats):
+    """Best and mean wall time of repeated calls."""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), sum(timings) / len(timings)
+
+
+def _git_commit():
+    """Current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_size(calculator, rows, seed=0, repeats=DEFAULT_REPEATS, scalar_limit=DEFAULT_SCALAR_LIMIT):
+    """
+    Time each calculator entry point on one workforce size.
+
+    Args:
+        calculator (SalaryCalculator): Calculator under test
+        rows (int): Employees in the synthetic workforce
+        seed (int, optional): Workforce seed
+        repeats (int, optional): Timed runs per benchmark; the best is kept
+        scalar_limit (int, optional): Maximum calls timed for scalar methods
+
+    Returns:
+        list: One result dict per benchmark
+    """
+    df = generate_workforce(rows, seed)
+    scalar_rows = min(rows, scalar_limit)
+    start_dates = df['START DATE'].to_numpy()[:scalar_rows].tolist()
+    end_dates = df['END DATE'].to_numpy()[:scalar_rows].tolist()
+    taxable_pay = calculator.process_dataframe(df.iloc[:scalar_rows])['TAXABLE_PAY'].tolist()
+
+    def working_days_ratio():
+        for start_date, end_date in zip(start_dates, end_dates):
+            calculator.calculate_working_days_ratio(start_date, end_date)
+
+    def paye():
+        for amount in taxable_pay:
+            calculator.calculate_paye(amount)
+
+    benchmarks = [
+        ('process_dataframe', rows, lambda: calculator.process_dataframe(df)),
+        ('calculate_working_days_ratio', scalar_rows, working_days_ratio),
+        ('calculate_paye', scalar_rows, paye),
+    ]
+
+    results = []
+    for name, timed_rows, function in benchmarks:
+        best, mean = _time(function, repeats)
+        results.append({
+            'benchmark': name,
+            'rows': rows,
+            'timed_rows': timed_rows,
+            'best_seconds': round(best, 6),
+            'mean_seconds': round(mean, 6),
+            'rows_per_second': round(timed_rows / best, 1) if best else None
+        })
+    return results
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, seed=0, repeats=DEFAULT_REPEATS,
+                   scalar_limit=DEFAULT_SCALAR_LIMIT, components=DEFAULT_COMPONENTS):
+    """
+    Run the benchmark suite over several workforce sizes.
+
+    Returns:
+        dict: Run metadata and a list of results, ready for json.dump
+    """
+    calculator = SalaryCalculator(components)
+    results = []
+    for rows in sizes:
+        results.extend(benchmark_size(calculator, rows, seed, repeats, scalar_limit))
+
+    return {
+        'metadata': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.platform(),
+            'seed': seed,
+            'repeats': repeats
+        },
+        'results': results
+    }
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare two benchmark runs on throughput.
+
+    Args:
+        baseline (dict): Earlier output of run_benchmarks
+        current (dict): Later output of run_benchmarks
+        threshold (float, optional): Relative slowdown counted as a regression
+
+    Returns:
+        list: One dict per benchmark present in both runs, with the change in
+            rows per second and a regression flag
+    """
+    previous = {(result['benchmark'], result['rows']): result for result in baseline['results']}
+    comparison = []
+    for result in current['results']:
+        before = previous.get((result['benchmark'], result['rows']))
+        if not before or not before['rows_per_second'] or not result['rows_per_second']:
+            continue
+        change = result['rows_per_second'] / before['rows_per_second'] - 1
+        comparison.append({
+            'benchmark': result['benchmark'],
+            'rows': result['rows'],
+            'baseline_rows_per_second': before['rows_per_second'],
+            'rows_per_second': result['rows_per_second'],
+            'change': round(change, 4),
+            'regression': change < -threshold
+        })
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark salary calculator throughput")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Workforce sizes to time")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help="Timed runs per benchmark")
+    parser.add_argument('--seed', type=int, default=0, help="Synthetic workforce seed")
+    parser.add_argument('--scalar-limit', type=int, default=DEFAULT_SCALAR_LIMIT,
+                        help="Maximum calls timed for scalar methods")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file to check for regressions")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.seed, args.repeats, args.scalar_limit)
+    for result in report['results']:
+        print(f"{result['benchmark']:<30} {result['rows']:>9,} rows  "
+              f"{result['best_seconds']:>10.4f}s  {result['rows_per_second']:>14,.0f} rows/s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = 0
+        for row in compare_results(baseline, report):
+            flag = "REGRESSION" if row['regression'] else ""
+            print(f"{row['benchmark']:<30} {row['rows']:>9,} rows  {row['change'] * 100:+7.1f}%  {flag}")
+            regressions += row['regression']
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Business-day calendars used to prorate salaries
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Nigerian federal public holidays that fall on the same date every year
+NIGERIA_FIXED_HOLIDAYS = [
+    (1, 1),    # New Year's Day
+    (5, 1),    # Workers' Day
+    (6, 12),   # Democracy Day
+    (10, 1),   # Independence Day
+    (12, 25),  # Christmas Day
+    (12, 26),  # Boxing Day
+]
+
+
+def to_days(dates):
+    """Parse a date, or a column of dates, to a day-precision numpy array."""
+    if isinstance(dates, np.ndarray) and np.issubdtype(dates.dtype, np.datetime64):
+        return dates.astype('datetime64[D]')
+    if not pd.api.types.is_list_like(dates):
+        return np.array([pd.Timestamp(dates).to_datetime64()], dtype='datetime64[D]')
+    if not isinstance(dates, pd.Series):
+        dates = pd.Series(np.atleast_1d(dates))
+    try:
+        parsed = pd.to_datetime(dates)
+    except (ValueError, TypeError):
+        parsed = pd.to_datetime(dates, format='mixed')
+    return parsed.to_numpy(dtype='datetime64[D]')
+
+
+def easter_sunday(year):
+    """Return Easter Sunday for a year (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def nigeria_federal_holidays(years, extra_dates=()):
+    """
+    List Nigerian federal public holidays for the given years.
+
+    Covers the fixed-date holidays plus Good Friday and Easter Monday. Eid
+    holidays and substitute days follow the lunar calendar and government
+    declarations, so pass them in ``extra_dates`` once announced.
+    """
+    holidays = []
+    for year in years:
+        holidays.extend(date(year, month, day) for month, day in NIGERIA_FIXED_HOLIDAYS)
+        easter = easter_sunday(year)
+        holidays.append(easter - timedelta(days=2))
+        holidays.append(easter + timedelta(days=1))
+    holidays.extend(pd.Timestamp(d).date() for d in extra_dates)
+    return holidays
+
+
+class BusinessCalendar:
+    """Counts business days, caching the total for each month it sees."""
+
+    def __init__(self, holidays=(), weekmask='1111100'):
+        self.holidays = np.unique(np.array([pd.Timestamp(d).date() for d in holidays],
+                                           dtype='datetime64[D]'))
+        self.weekmask = weekmask
+        self._busdaycal = np.busdaycalendar(weekmask=weekmask, holidays=self.holidays)
+        self._month_totals = {}
+
+    def __reduce__(self):
+        # numpy.busdaycalendar cannot be pickled, so rebuild it in worker processes
+        return (BusinessCalendar, (self.holidays.tolist(), self.weekmask))
+
+    def business_days_between(self, start_dates, end_dates):
+        """Count business days from start to end inclusive, for whole columns."""
+        start = to_days(start_dates)
+        end = to_days(end_dates)
+        return np.maximum(np.busday_count(start, end + 1, busdaycal=self._busdaycal), 0)
+
+    def month_business_days(self, dates):
+        """Total business days in the month of each date."""
+        months = to_days(dates).astype('datetime64[M]')
+        unique_months, inverse = np.unique(months, return_inverse=True)
+
+        totals = np.empty(len(unique_months), dtype=np.int64)
+        for i, month in enumerate(unique_months):
+            total = self._month_totals.get(month)
+            if total is None:
+                first = month.astype('datetime64[D]')
+                last = (month + 1).astype('datetime64[D]')
+                total = int(np.busday_count(first, last, busdaycal=self._busdaycal))
+                self._month_totals[month] = total
+            totals[i] = total
+        return totals[inverse]
+
+    def working_days_ratio(self, start_dates, end_dates):
+        """Share of the end date's month worked, unrounded, for whole columns."""
+        worked = self.business_days_between(start_dates, end_dates)
+        return worked / self.month_business_days(end_dates)
+
+
+# Monday to Friday with no public holidays, matching the original proration
+WEEKDAY_CALENDAR = BusinessCalendar()
+
+
+def nigeria_calendar(years, extra_dates=()):
+    """Build a calendar that skips Nigerian federal holidays in the given years."""
+    return BusinessCalendar(nigeria_federal_holidays(years, extra_dates))
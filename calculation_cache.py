@@ -0,0 +1,110 @@
+"""
+Memoization of salary calculations keyed by a hash of their inputs
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Canonical binary layout of the inputs that determine a calculation. Hashing
+# these bytes gives the same key whether a row came from process_employee or
+# from a whole dataframe.
+CACHE_KEY_DTYPE = np.dtype([
+    ('annual_gross', '<f8'),
+    ('start_day', '<i8'),
+    ('end_day', '<i8'),
+    ('is_contract', '?'),
+    ('voluntary_pension', '<f8'),
+    ('reimbursements', '<f8'),
+    ('other_deductions', '<f8'),
+])
+
+DEFAULT_MAX_ENTRIES = 200000
+
+
+def config_fingerprint(*parts):
+    """Hash calculator configuration into a 32-byte key for input hashes."""
+    digest = hashlib.blake2b(digest_size=32)
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.digest()
+
+
+def input_keys(records, fingerprint):
+    """Hash each record of a CACHE_KEY_DTYPE array under a configuration fingerprint."""
+    raw = np.ascontiguousarray(records, dtype=CACHE_KEY_DTYPE).tobytes()
+    size = CACHE_KEY_DTYPE.itemsize
+    return [
+        hashlib.blake2b(raw[offset:offset + size], key=fingerprint, digest_size=16).digest()
+        for offset in range(0, len(raw), size)
+    ]
+
+
+class CalculationCache:
+    """
+    Bounded LRU cache of calculated amounts with hit and miss counters.
+
+    One instance is shared by every Streamlit session, so lookups, stores
+    and the counters are guarded by a lock.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value for a key, or None, updating the counters."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries when full."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_shared_cache = CalculationCache()
+
+
+def shared_cache():
+    """Process-wide cache reused across Streamlit reruns and sessions."""
+    return _shared_cache
@@ -0,0 +1,293 @@
+"""
+Step-by-step explanations of individual salary calculations
+"""
+import json
+import math
+from numbers import Integral, Real
+
+import pandas as pd
+
+from tax_rules import compile_rules
+
+# Bump when the layout of serialised traces changes
+TRACE_FORMAT_VERSION = 1
+
+# Arrears column -> result column it was added to by arrears.apply_arrears
+ARREARS_COLUMNS = {
+    'ARREARS_GROSS_PAY': 'PRORATED_MONTHLY_GROSS',
+    'ARREARS_PENSION_EMPLOYEE': 'MANDATORY_PENSION',
+    'ARREARS_PENSION_EMPLOYER': 'EMPLOYER_PENSION',
+    'ARREARS_PAYE_TAX': 'PAYE_TAX',
+    'ARREARS_NET_PAY': 'NET_PAY',
+    'ARREARS_TAXABLE_PAY': 'TAXABLE_PAY',
+}
+
+
+def _plain(value):
+    """Convert numpy, pandas and date values to JSON-friendly Python values."""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, Integral):
+        return int(value)
+    if isinstance(value, Real):
+        return None if math.isnan(value) else float(value)
+    return str(value)[:10] if hasattr(value, 'strftime') else str(value)
+
+
+def _naira(amount):
+    return f"₦{amount:,.2f}"
+
+
+def _percent(rate):
+    return f"{rate * 100:g}%"
+
+
+def _item(label, value, formula=''):
+    return {'item': label, 'value': value, 'formula': formula}
+
+
+def rules_to_dict(rules):
+    """Serialisable form of a statutory rule version (the open top band as null)."""
+    values = dict(zip(
+        ['effective_from', 'tax_bands', 'employee_pension_rate', 'employer_pension_rate',
+         'pension_threshold', 'cra_percent_rate', 'cra_minimum_rate', 'cra_annual_floor'],
+        rules.key()
+    ))
+    values['tax_bands'] = [[None if width == float('inf') else width, rate] for width, rate in rules.tax_bands]
+    return values
+
+
+def rules_from_dict(values):
+    """Compile a rule version stored with rules_to_dict."""
+    values = dict(values)
+    values['tax_bands'] = tuple(
+        (float('inf') if width is None else width, rate) for width, rate in values['tax_bands']
+    )
+    return compile_rules(**values)
+
+
+class CalculationTrace:
+    """
+    Structured explanation of how one employee's pay was worked out.
+
+    Built from a calculated result record and the rule version it was paid
+    under, so nothing is recomputed and bulk runs pay nothing unless a trace
+    is asked for. Steps are derived the first time they are read, and a
+    trace can be stored as JSON and reloaded without the calculator.
+
+    Results taxed on year-to-date totals (with TAX_PERIOD, PREVIOUS_TAXABLE
+    and PREVIOUS_TAX) explain cumulative PAYE, and arrears added to a result
+    are shown as their own step after the regular pay.
+    """
+
+    def __init__(self, result, rules, components=None, working_days=None):
+        """
+        Args:
+            result (Mapping): One employee's result, e.g. a SalaryResult or results row
+            rules (StatutoryRules): Rule version the result was calculated under
+            components (dict, optional): Component percentages used
+            working_days (tuple, optional): (business days worked, business days in month)
+        """
+        self.result = {column: _plain(value) for column, value in result.items()}
+        self.rules = rules
+        self.components = dict(components) if components is not None else None
+        self.working_days = tuple(int(days) for days in working_days) if working_days else None
+        self._steps = None
+
+    @property
+    def steps(self):
+        """Calculation steps, derived on first access."""
+        if self._steps is None:
+            self._steps = self._build_steps()
+        return self._steps
+
+    def _regular_result(self):
+        """The result without any arrears added to it."""
+        r = dict(self.result)
+        for arrears_column, column in ARREARS_COLUMNS.items():
+            r[column] = round(r[column] - (r.get(arrears_column) or 0.0), 2)
+        r['TOTAL_DEDUCTIONS'] = round(
+            r['TOTAL_DEDUCTIONS'] - (self.result.get('ARREARS_PENSION_EMPLOYEE') or 0.0)
+            - (self.result.get('ARREARS_PAYE_TAX') or 0.0), 2
+        )
+        return r
+
+    def _build_steps(self):
+        r = self._regular_result()
+        rules = self.rules
+        steps = []
+
+        # Proration
+        proration = [
+            _item("Monthly gross", r['MONTHLY_GROSS'], f"{_naira(r['ANNUAL GROSS PAY'])} / 12"),
+        ]
+        if self.working_days:
+            worked, total = self.working_days
+            proration.append(_item("Business days worked", worked, f"{r['START DATE']} to {r['END DATE']}"))
+            proration.append(_item("Business days in month", total))
+        proration.append(_item("Working days ratio", r['WORKING_DAYS_RATIO'],
+                               f"{self.working_days[0]} / {self.working_days[1]}" if self.working_days else ''))
+        steps.append({
+            'step': 'proration',
+            'label': "Proration",
+            'details': proration,
+            'result': _item("Prorated monthly gross", r['PRORATED_MONTHLY_GROSS'],
+                            f"{_naira(r['MONTHLY_GROSS'])} x {r['WORKING_DAYS_RATIO']}")
+        })
+
+        # Components
+        components = []
+        for column in ['COMP_BASIC', 'COMP_TRANSPORT', 'COMP_HOUSING', 'COMP_UTILITY', 'COMP_MEAL', 'COMP_CLOTHING']:
+            name = column[len('COMP_'):]
+            percentage = (self.components or {}).get(name)
+            formula = f"{_naira(r['MONTHLY_GROSS'])} x {percentage:g}% x {r['WORKING_DAYS_RATIO']}" if percentage is not None else ''
+            components.append(_item(name.title(), r[column], formula))
+        steps.append({'step': 'components', 'label': "Salary components", 'details': components, 'result': None})
+
+        # Pension
+        pensionable_base = round(r['COMP_BASIC'] + r['COMP_TRANSPORT'] + r['COMP_HOUSING'], 2)
+        if str(r['Contract Type']).strip().upper() == 'CONTRACT':
+            pension = [_item("Not pensionable", 0.0, "CONTRACT staff")]
+        elif r['PRORATED_MONTHLY_GROSS'] < rules.pension_threshold:
+            pension = [_item("Not pensionable", 0.0,
+                             f"{_naira(r['PRORATED_MONTHLY_GROSS'])} below {_naira(rules.pension_threshold)}")]
+        else:
+            pension = [
+                _item("Pensionable base", pensionable_base, "Basic + Transport + Housing"),
+                _item("Employee pension", r['MANDATORY_PENSION'],
+                      f"{_percent(rules.employee_pension_rate)} of {_naira(pensionable_base)}"),
+                _item("Employer pension", r['EMPLOYER_PENSION'],
+                      f"{_percent(rules.employer_pension_rate)} of {_naira(pensionable_base)}"),
+                _item("Voluntary pension", r['VOLUNTARY_PENSION']),
+            ]
+        steps.append({
+            'step': 'pension',
+            'label': "Pension",
+            'details': pension,
+            'result': _item("Employee pension deductions", round(r['MANDATORY_PENSION'] + r['VOLUNTARY_PENSION'], 2))
+        })
+
+        # Consolidated Relief Allowance
+        adjusted_gross = round(r['PRORATED_MONTHLY_GROSS'] - r['MANDATORY_PENSION'] - r['VOLUNTARY_PENSION'], 2)
+        cra_percentage = round(rules.cra_percent_rate * adjusted_gross, 2)
+        minimum_relief = round(max(rules.cra_minimum_rate * adjusted_gross, rules.cra_annual_floor / 12), 2)
+        steps.append({
+            'step': 'cra',
+            'label': "Consolidated Relief Allowance",
+            'details': [
+                _item("Gross after pension", adjusted_gross, "Prorated gross - employee and voluntary pension"),
+                _item("Percentage relief", cra_percentage, f"{_percent(rules.cra_percent_rate)} of {_naira(adjusted_gross)}"),
+                _item("Minimum relief", minimum_relief,
+                      f"higher of {_percent(rules.cra_minimum_rate)} of {_naira(adjusted_gross)} "
+                      f"and {_naira(rules.cra_annual_floor)} / 12"),
+            ],
+            'result': _item("CRA", r['CRA'], "Percentage relief + minimum relief")
+        })
+
+        # PAYE, band by band on the annualised taxable pay, or on the
+        # year-to-date taxable pay annualised over the months so far
+        period = r.get('TAX_PERIOD')
+        if period:
+            ytd_taxable = round(r['PREVIOUS_TAXABLE'] + r['TAXABLE_PAY'], 2)
+            annual_taxable = max(ytd_taxable * 12 / period, 0.0)
+        else:
+            annual_taxable = max(r['TAXABLE_PAY'] * 12, 0.0)
+        table = rules.tax_table
+        bands = []
+        annual_tax = 0.0
+        for i, (lower, rate) in enumerate(zip(table.thresholds.tolist(), table.rates.tolist())):
+            upper = table.thresholds[i + 1] if i + 1 < len(table.thresholds) else float('inf')
+            taxed = min(max(annual_taxable - lower, 0.0), upper - lower)
+            annual_tax += taxed * rate
+            if upper == float('inf'):
+                label = f"Band {i + 1}: above {_naira(lower)}"
+            else:
+                label = f"Band {i + 1}: {'first' if i == 0 else 'next'} {_naira(upper - lower)}"
+            bands.append(_item(label, round(taxed * rate, 2), f"{_percent(rate)} of {_naira(taxed)}"))
+        if period:
+            tax_due = round(annual_tax * period / 12, 2)
+            paye = [
+                _item("Taxable pay", r['TAXABLE_PAY'], "Gross after pension - CRA"),
+                _item("Taxable pay to date", ytd_taxable,
+                      f"{_naira(r['PREVIOUS_TAXABLE'])} earlier this year + {_naira(r['TAXABLE_PAY'])}"),
+                _item("Annualised taxable pay to date", round(annual_taxable, 2),
+                      f"{_naira(ytd_taxable)} x 12 / {period:g}"),
+                *bands,
+                _item("Annual tax", round(annual_tax, 2), "Sum of bands"),
+                _item("Tax due to date", tax_due, f"{_naira(annual_tax)} x {period:g} / 12"),
+                _item("Tax deducted earlier this year", r['PREVIOUS_TAX']),
+            ]
+            paye_result = _item("Monthly PAYE", r['PAYE_TAX'], f"{_naira(tax_due)} - {_naira(r['PREVIOUS_TAX'])}")
+        else:
+            paye = [
+                _item("Taxable pay", r['TAXABLE_PAY'], "Gross after pension - CRA"),
+                _item("Annual taxable pay", round(annual_taxable, 2), f"{_naira(r['TAXABLE_PAY'])} x 12"),
+                *bands,
+                _item("Annual tax", round(annual_tax, 2), "Sum of bands"),
+            ]
+            paye_result = _item("Monthly PAYE", r['PAYE_TAX'], f"{_naira(annual_tax)} / 12")
+        steps.append({'step': 'paye', 'label': "PAYE tax", 'details': paye, 'result': paye_result})
+
+        # Net pay
+        steps.append({
+            'step': 'net_pay',
+            'label': "Net pay",
+            'details': [
+                _item("Total deductions", r['TOTAL_DEDUCTIONS'], "PAYE + employee pension + voluntary pension + other deductions"),
+                _item("Reimbursements", r['REIMBURSEMENTS']),
+            ],
+            'result': _item("Net pay", r['NET_PAY'], "Prorated gross - total deductions + reimbursements")
+        })
+
+        # Arrears from backdated pay changes, paid on top of the regular pay
+        arrears = {column: self.result.get(column) or 0.0 for column in ARREARS_COLUMNS}
+        if any(arrears.values()):
+            steps.append({
+                'step': 'arrears',
+                'label': "Arrears",
+                'details': [
+                    _item("Gross arrears", arrears['ARREARS_GROSS_PAY']),
+                    _item("Employee pension arrears", arrears['ARREARS_PENSION_EMPLOYEE']),
+                    _item("Employer pension arrears", arrears['ARREARS_PENSION_EMPLOYER']),
+                    _item("Taxable pay arrears", arrears['ARREARS_TAXABLE_PAY']),
+                    _item("PAYE arrears", arrears['ARREARS_PAYE_TAX']),
+                    _item("Net arrears", arrears['ARREARS_NET_PAY']),
+                ],
+                'result': _item("Net pay with arrears", self.result['NET_PAY'],
+                                f"{_naira(r['NET_PAY'])} + {_naira(arrears['ARREARS_NET_PAY'])}")
+            })
+        return steps
+
+    def to_dict(self):
+        """Serialisable form of the whole trace."""
+        return {
+            'version': TRACE_FORMAT_VERSION,
+            'rules': rules_to_dict(self.rules),
+            'components': self.components,
+            'working_days': list(self.working_days) if self.working_days else None,
+            'result': self.result,
+            'steps': self.steps
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_dict(cls, data):
+        """Reload a stored trace, keeping its steps as stored or deriving them when absent."""
+        trace = cls(data['result'], rules_from_dict(data['rules']), data.get('components'), data.get('working_days'))
+        trace._steps = data.get('steps')
+        return trace
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def to_dataframe(self):
+        """One row per line of the explanation, for display."""
+        rows = []
+        for step in self.steps:
+            lines = step['details'] + ([step['result']] if step['result'] else [])
+            rows.extend({'Step': step['label'], 'Item': line['item'], 'Value': line['value'],
+                         'Calculation': line['formula']} for line in lines)
+        return pd.DataFrame(rows, columns=['Step', 'Item', 'Value', 'Calculation'])
@@ -0,0 +1,253 @@
+"""
+Parquet and Arrow input and output for bulk salary calculation
+
+pyarrow is optional (the 'columnar' extra): CSV keeps working without it,
+and the columnar formats raise a clear error until it is installed.
+"""
+import os
+
+import pandas as pd
+
+from salary_calculator import IDENTITY_COLUMNS, OUTPUT_COLUMNS
+
+PARQUET = 'parquet'
+ARROW = 'arrow'
+CSV = 'csv'
+
+# File suffixes recognised for each format; anything else is read as CSV
+FORMAT_SUFFIXES = {
+    '.parquet': PARQUET,
+    '.pq': PARQUET,
+    '.arrow': ARROW,
+    '.feather': ARROW,
+    '.ipc': ARROW,
+}
+
+# Optional input columns used by the calculator when present
+OPTIONAL_INPUT_COLUMNS = ['Reimbursements', 'Other Deductions', 'VOLUNTARY_PENSION']
+
+# Columns read from an input file; anything else in an HRIS export is skipped
+INPUT_COLUMNS = IDENTITY_COLUMNS + OPTIONAL_INPUT_COLUMNS
+
+TEXT_COLUMNS = ['Account Number', 'STAFF ID', 'Email', 'NAME', 'DEPARTMENT', 'JOB TITLE', 'Contract Type']
+DATE_COLUMNS = ['START DATE', 'END DATE']
+
+# CSV columns read with a fixed dtype, so account numbers and staff IDs stay
+# text (keeping their leading zeros) and every chunk gets the same dtypes
+CSV_DTYPES = {column: str for column in TEXT_COLUMNS} | {'ANNUAL GROSS PAY': float}
+
+# Rows read, calculated and written per step for columnar files
+DEFAULT_BATCH_SIZE = 65536
+
+
+def _pyarrow():
+    """Import pyarrow on first use so CSV-only installs do not need it."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "Parquet and Arrow files need the optional pyarrow dependency; "
+            "install it with the 'columnar' extra or pip install pyarrow"
+        ) from e
+    return pyarrow
+
+
+def arrow_available():
+    """True when pyarrow is installed."""
+    try:
+        _pyarrow()
+    except ImportError:
+        return False
+    return True
+
+
+def _field_type(pa, column):
+    """Arrow type of an input or output column: text, date or float."""
+    if column in TEXT_COLUMNS:
+        return pa.string()
+    if column in DATE_COLUMNS:
+        return pa.date32()
+    return pa.float64()
+
+
+def input_schema(columns=INPUT_COLUMNS):
+    """Explicit Arrow schema for employee input files."""
+    pa = _pyarrow()
+    return pa.schema([(column, _field_type(pa, column)) for column in columns])
+
+
+def output_schema():
+    """Explicit Arrow schema for calculated results."""
+    pa = _pyarrow()
+    return pa.schema([(column, _field_type(pa, column)) for column in OUTPUT_COLUMNS])
+
+
+def detect_format(name):
+    """File format from a path or upload name, defaulting to CSV."""
+    return FORMAT_SUFFIXES.get(os.path.splitext(str(name))[1].lower(), CSV)
+
+
+def _conform(table, schema):
+    """Cast a table's columns to the schema, in schema order."""
+    pa = _pyarrow()
+    arrays = []
+    for field in schema:
+        column = table.column(field.name)
+        if pa.types.is_null(column.type):
+            column = pa.nulls(len(column), field.type)
+        arrays.append(column.cast(field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _to_pandas(table):
+    """Convert an input table to the DataFrame layout the calculator expects."""
+    return table.to_pandas(date_as_object=False)
+
+
+def _projection(names):
+    """Input columns to read from a file with the given column names."""
+    missing = [column for column in IDENTITY_COLUMNS if column not in names]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    return [column for column in INPUT_COLUMNS if column in names]
+
+
+def iter_employee_batches(source, file_format=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Read a Parquet or Arrow file of employees batch by batch.
+
+    Only the columns the calculator uses are read, and each batch is cast
+    to the input schema, so account numbers stay text and dates stay dates.
+
+    Args:
+        source (str or file-like): Parquet or Arrow IPC file
+        file_format (str, optional): 'parquet' or 'arrow'; detected from the name if omitted
+        batch_size (int, optional): Rows per batch for Parquet files
+
+    Yields:
+        pd.DataFrame: One batch of employees
+    """
+    pa = _pyarrow()
+    file_format = file_format or detect_format(getattr(source, 'name', source))
+
+    if file_format == PARQUET:
+        parquet_file = pa.parquet.ParquetFile(source)
+        columns = _projection(parquet_file.schema_arrow.names)
+        schema = input_schema(columns)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            yield _to_pandas(_conform(pa.Table.from_batches([batch]), schema))
+    elif file_format == ARROW:
+        reader = pa.ipc.open_file(source)
+        columns = _projection(reader.schema.names)
+        schema = input_schema(columns)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i).select(columns)
+            yield _to_pandas(_conform(pa.Table.from_batches([batch]), schema))
+    else:
+        raise ValueError(f"Unsupported columnar format: {file_format}")
+
+
+def read_employees(source, file_format=None):
+    """
+    Read a whole employee file into a DataFrame.
+
+    Parquet and Arrow files are read with column projection and the input
+    schema; anything else falls back to ``pd.read_csv`` with CSV_DTYPES.
+    """
+    file_format = file_format or detect_format(getattr(source, 'name', source))
+    if file_format == CSV:
+        return pd.read_csv(source, dtype=CSV_DTYPES)
+
+    batches = list(iter_employee_batches(source, file_format))
+    if not batches:
+        return pd.DataFrame(columns=INPUT_COLUMNS)
+    return pd.concat(batches, ignore_index=True)
+
+
+def results_table(results):
+    """Convert calculated results to an Arrow table with the output schema."""
+    pa = _pyarrow()
+    table = pa.Table.from_pandas(results[OUTPUT_COLUMNS], preserve_index=False)
+    return _conform(table, output_schema())
+
+
+def parquet_bytes(df):
+    """
+    Serialise a DataFrame to Parquet bytes for download.
+
+    Known calculator columns get their schema types; any other columns keep
+    the types Arrow infers for them.
+    """
+    pa = _pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    schema = pa.schema([
+        (field.name, _field_type(pa, field.name) if field.name in OUTPUT_COLUMNS else field.type)
+        for field in table.schema
+    ])
+    sink = pa.BufferOutputStream()
+    pa.parquet.write_table(_conform(table, schema), sink)
+    return sink.getvalue().to_pybytes()
+
+
+def write_results(results, destination, file_format=None):
+    """
+    Write calculated results as Parquet, Arrow or CSV.
+
+    Args:
+        results (pd.DataFrame): Output of process_dataframe
+        destination (str or file-like): Path or binary stream
+        file_format (str, optional): Detected from the destination name if omitted
+    """
+    file_format = file_format or detect_format(getattr(destination, 'name', destination))
+    writer = ResultWriter(destination, file_format)
+    try:
+        writer.write(results)
+    finally:
+        writer.close()
+
+
+class ResultWriter:
+    """
+    Append batches of results to one Parquet, Arrow or CSV file.
+
+    Columnar output uses the fixed output schema, so every batch lands in
+    the same typed columns whatever the input format was.
+    """
+
+    def __init__(self, destination, file_format=CSV):
+        self.file_format = file_format
+        self._writer = None
+        self._rows_written = 0
+
+        self._owns_handle = not hasattr(destination, 'write')
+        if file_format == CSV:
+            self._handle = open(destination, 'w', newline='', encoding='utf-8') if self._owns_handle else destination
+        else:
+            pa = _pyarrow()
+            self._handle = destination
+            if file_format == PARQUET:
+                self._writer = pa.parquet.ParquetWriter(destination, output_schema())
+            elif file_format == ARROW:
+                self._writer = pa.ipc.new_file(destination, output_schema())
+            else:
+                raise ValueError(f"Unsupported output format: {file_format}")
+
+    def write(self, results):
+        """Append one batch of results."""
+        if self.file_format == CSV:
+            results.to_csv(self._handle, index=False, header=self._rows_written == 0)
+        else:
+            self._writer.write_table(results_table(results))
+        self._rows_written += len(results)
+
+    def close(self):
+        """Finish the file, writing an empty one if no batches were written."""
+        if self.file_format == CSV:
+            if self._rows_written == 0:
+                pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(self._handle, index=False)
+            if self._owns_handle:
+                self._handle.close()
+        else:
+            self._writer.close()
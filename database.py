@@ -1,13 +1,89 @@
 import sqlite3
 import os
+import json
+import threading
 import bcrypt
 from datetime import datetime
+from tax_rules import DEFAULT_RULES
+
+# SQLite database file, relative to the working directory
+DATABASE_PATH = 'payroll.db'
+
+# Prepared statements the sqlite3 module keeps compiled per connection
+STATEMENT_CACHE_SIZE = 256
+
+# Pragmas applied to every new connection. WAL lets readers run alongside
+# a writer, and busy_timeout waits for the write lock instead of failing.
+CONNECTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+# Secondary indexes for the per-user lookups, sorts and joins below, by name
+INDEXES = {
+    'idx_employees_user_created': 'employees (user_id, created_at)',
+    'idx_employees_user_department': 'employees (user_id, department)',
+    'idx_payroll_periods_user_status': 'payroll_periods (user_id, status, start_date)',
+    'idx_payroll_periods_user_dates': 'payroll_periods (user_id, start_date)',
+    'idx_payroll_runs_user_period': 'payroll_runs (user_id, period_id)',
+    'idx_payroll_details_run': 'payroll_details (run_id, employee_id)',
+    'idx_payroll_details_employee': 'payroll_details (employee_id)',
+    'idx_payroll_arrears_user_status': 'payroll_arrears (user_id, status, employee_id)',
+}
+
+# Employee columns in the full-text search index, and the bm25 weight of a
+# match in each; names and staff IDs outrank department and job title
+EMPLOYEE_SEARCH_WEIGHTS = {
+    'full_name': 10.0,
+    'email': 5.0,
+    'staff_id': 10.0,
+    'department': 2.0,
+    'job_title': 2.0,
+}
+
+_local = threading.local()
+
+def get_connection():
+    """
+    Get this thread's shared connection to the database
+
+    Connections are opened once per thread and database file and reused by
+    every function here, instead of connecting on each call.
+    """
+    path = os.path.abspath(DATABASE_PATH)
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=CONNECTION_PRAGMAS['busy_timeout'] / 1000,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for name, value in CONNECTION_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        connections[path] = conn
+    return conn
+
+def release_connection(conn):
+    """Finish with the shared connection, rolling back anything left uncommitted"""
+    if conn.in_transaction:
+        conn.rollback()
+
+def close_connections():
+    """Close this thread's connections, e.g. before the database file is replaced"""
+    for conn in getattr(_local, 'connections', {}).values():
+        release_connection(conn)
+        conn.close()
+    _local.connections = {}
 
 def init_db():
     # First, check if we need to run the migration
-    db_exists = os.path.exists('payroll.db')
+    db_exists = os.path.exists(DATABASE_PATH)
     
-    conn = sqlite3.connect('payroll.db')
+    conn = get_connection()
     c = conn.cursor()
     
     # Check if migration is needed (if tables exist but don't have user_id column)
@@ -27,7 +103,7 @@ def init_db():
     
     # If migration is needed, run it from the migration script
     if needs_migration:
-        conn.close()
+        release_connection(conn)
         from migrate_db import migrate_database
         migrate_database()
         return
@@ -96,9 +172,12 @@ def init_db():
                 user_id INTEGER NOT NULL,
                 period_id INTEGER NOT NULL,
                 run_date TEXT NOT NULL,
+                run_type TEXT NOT NULL DEFAULT 'regular' CHECK(run_type IN ('regular', 'off_cycle')),
                 status TEXT DEFAULT 'draft' CHECK(status IN ('draft', 'pending_approval', 'approved', 'rejected')),
                 approved_by TEXT,
                 approved_at TEXT,
+                rules TEXT,
+                components TEXT,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users (id),
                 FOREIGN KEY (period_id) REFERENCES payroll_periods (id)
@@ -125,21 +204,185 @@ def init_db():
                 paye_tax REAL NOT NULL,
                 other_deductions REAL NOT NULL,
                 reimbursements REAL NOT NULL,
+                calculation_trace TEXT,
+                payment_type TEXT,
+                annual_gross_pay REAL,
+                working_days_ratio REAL,
+                arrears_gross_pay REAL DEFAULT 0,
+                arrears_pension_employee REAL DEFAULT 0,
+                arrears_pension_employer REAL DEFAULT 0,
+                arrears_paye_tax REAL DEFAULT 0,
+                arrears_net_pay REAL DEFAULT 0,
+                arrears_taxable_pay REAL DEFAULT 0,
+                contract_type TEXT,
+                start_date TEXT,
+                end_date TEXT,
+                monthly_gross REAL,
+                cra REAL,
+                tax_relief REAL,
+                taxable_pay REAL,
+                total_deductions REAL,
+                days_worked INTEGER,
+                days_in_month INTEGER,
+                tax_period INTEGER,
+                previous_taxable REAL,
+                previous_tax REAL,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (run_id) REFERENCES payroll_runs (id),
                 FOREIGN KEY (employee_id) REFERENCES employees (id)
             )
         ''')
 
+        # Add columns introduced after a database was first created
+        _add_missing_columns(c, 'payroll_runs', {
+            'run_type': "TEXT NOT NULL DEFAULT 'regular'", 'rules': 'TEXT', 'components': 'TEXT'
+        })
+        _add_missing_columns(c, 'payroll_details', {
+            'calculation_trace': 'TEXT', 'payment_type': 'TEXT',
+            'annual_gross_pay': 'REAL', 'working_days_ratio': 'REAL',
+            **{column: 'REAL DEFAULT 0' for column in PAYROLL_ARREARS_COLUMNS},
+            'contract_type': 'TEXT', 'start_date': 'TEXT', 'end_date': 'TEXT',
+            'monthly_gross': 'REAL', 'cra': 'REAL', 'tax_relief': 'REAL', 'taxable_pay': 'REAL',
+            'total_deductions': 'REAL', 'days_worked': 'INTEGER', 'days_in_month': 'INTEGER',
+            'tax_period': 'INTEGER', 'previous_taxable': 'REAL', 'previous_tax': 'REAL'
+        })
+
+        # Create payroll_ytd table of per-employee running totals for cumulative PAYE
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS payroll_ytd (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id INTEGER NOT NULL,
+                tax_year INTEGER NOT NULL,
+                months_paid INTEGER NOT NULL DEFAULT 0,
+                cumulative_gross REAL NOT NULL DEFAULT 0,
+                cumulative_relief REAL NOT NULL DEFAULT 0,
+                cumulative_taxable REAL NOT NULL DEFAULT 0,
+                cumulative_tax REAL NOT NULL DEFAULT 0,
+                last_run_id INTEGER,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (employee_id) REFERENCES employees (id),
+                FOREIGN KEY (last_run_id) REFERENCES payroll_runs (id),
+                UNIQUE (employee_id, tax_year)
+            )
+        ''')
+
+        # Create payroll_arrears table of back pay owed from backdated pay changes
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS payroll_arrears (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                employee_id INTEGER NOT NULL,
+                effective_date TEXT NOT NULL,
+                new_annual_gross REAL NOT NULL,
+                periods INTEGER NOT NULL,
+                gross_pay REAL NOT NULL,
+                pension_employee REAL NOT NULL,
+                pension_employer REAL NOT NULL,
+                paye_tax REAL NOT NULL,
+                net_pay REAL NOT NULL,
+                status TEXT DEFAULT 'pending' CHECK(status IN ('pending', 'paid')),
+                paid_run_id INTEGER,
+                period_id INTEGER,
+                taxable_pay REAL DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id),
+                FOREIGN KEY (employee_id) REFERENCES employees (id),
+                FOREIGN KEY (paid_run_id) REFERENCES payroll_runs (id),
+                FOREIGN KEY (period_id) REFERENCES payroll_periods (id)
+            )
+        ''')
+        _add_missing_columns(c, 'payroll_arrears', {'period_id': 'INTEGER', 'taxable_pay': 'REAL DEFAULT 0'})
+
+        # Create statutory_rules table of effective-dated PAYE, pension and CRA rules
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS statutory_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                effective_from TEXT UNIQUE NOT NULL,
+                tax_bands TEXT NOT NULL,
+                employee_pension_rate REAL NOT NULL,
+                employer_pension_rate REAL NOT NULL,
+                pension_threshold REAL NOT NULL,
+                cra_percent_rate REAL NOT NULL,
+                cra_minimum_rate REAL NOT NULL,
+                cra_annual_floor REAL NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Seed the rules in force before any stored change
+        c.execute('''
+            INSERT OR IGNORE INTO statutory_rules (
+                effective_from, tax_bands, employee_pension_rate, employer_pension_rate,
+                pension_threshold, cra_percent_rate, cra_minimum_rate, cra_annual_floor
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', _statutory_rules_row(*DEFAULT_RULES.key()))
+
+        # Create secondary indexes, also on databases created before they existed
+        for name, columns in INDEXES.items():
+            c.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+
+        _create_employee_search(c)
+
         conn.commit()
     except Exception as e:
         print(f"Database initialization error: {str(e)}")
     finally:
-        conn.close()
+        release_connection(conn)
+
+def _create_employee_search(c):
+    """
+    Create the employees_fts full-text index and the triggers that keep it in sync
+
+    The index stores no copy of the text; it reads it from employees by rowid.
+    A database created before the index existed is indexed once, here.
+    """
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'employees_fts'")
+    if c.fetchone():
+        return
+
+    columns = ', '.join(EMPLOYEE_SEARCH_WEIGHTS)
+    old_columns = ', '.join(f'old.{column}' for column in EMPLOYEE_SEARCH_WEIGHTS)
+    new_columns = ', '.join(f'new.{column}' for column in EMPLOYEE_SEARCH_WEIGHTS)
+    c.execute(f'''
+        CREATE VIRTUAL TABLE employees_fts USING fts5(
+            {columns},
+            content='employees', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER employees_fts_insert AFTER INSERT ON employees BEGIN
+            INSERT INTO employees_fts (rowid, {columns}) VALUES (new.id, {new_columns});
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER employees_fts_delete AFTER DELETE ON employees BEGIN
+            INSERT INTO employees_fts (employees_fts, rowid, {columns}) VALUES ('delete', old.id, {old_columns});
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER employees_fts_update AFTER UPDATE OF {columns} ON employees BEGIN
+            INSERT INTO employees_fts (employees_fts, rowid, {columns}) VALUES ('delete', old.id, {old_columns});
+            INSERT INTO employees_fts (rowid, {columns}) VALUES (new.id, {new_columns});
+        END
+    ''')
+
+    # Rank matches by the column weights, then index any existing employees
+    weights = ', '.join(str(weight) for weight in EMPLOYEE_SEARCH_WEIGHTS.values())
+    c.execute("INSERT INTO employees_fts (employees_fts, rank) VALUES ('rank', ?)", (f'bm25({weights})',))
+    c.execute("INSERT INTO employees_fts (employees_fts) VALUES ('rebuild')")
+
+def _add_missing_columns(c, table, columns):
+    """Add nullable columns that an older copy of a table does not have yet"""
+    c.execute(f"PRAGMA table_info({table})")
+    existing = {column[1] for column in c.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
 
 # Add functions for payroll period management
 def create_payroll_period(user_id, period_name, start_date, end_date):
-    conn = sqlite3.connect('payroll.db')
+    conn = get_connection()
     c = conn.cursor()
 
     try:
@@ -152,40 +395,56 @@ def create_payroll_period(user_id, period_name, start_date, end_date):
     except Exception as e:
         return False, f"Error creating payroll period: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_active_payroll_period(user_id):
-    conn = sqlite3.connect('payroll.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_connection()
     c = conn.cursor()
+    c.row_factory = sqlite3.Row
 
     c.execute('SELECT * FROM payroll_periods WHERE user_id = ? AND status = "active" ORDER BY start_date DESC LIMIT 1', 
               (user_id,))
     period = c.fetchone()
 
-    conn.close()
+    release_connection(conn)
+    return dict(period) if period else None
+
+def get_payroll_period_for_date(user_id, day):
+    """Get the latest-starting payroll period of a user that covers a date, if any"""
+    conn = get_connection()
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+
+    c.execute('''
+        SELECT * FROM payroll_periods
+        WHERE user_id = ? AND start_date <= ? AND end_date >= ?
+        ORDER BY start_date DESC LIMIT 1
+    ''', (user_id, day, day))
+    period = c.fetchone()
+
+    release_connection(conn)
     return dict(period) if period else None
 
-def create_payroll_run(user_id, period_id):
-    conn = sqlite3.connect('payroll.db')
+def create_payroll_run(user_id, period_id, run_type='regular'):
+    conn = get_connection()
     c = conn.cursor()
 
     try:
         run_date = datetime.now().strftime('%Y-%m-%d')
         c.execute('''
-            INSERT INTO payroll_runs (user_id, period_id, run_date)
-            VALUES (?, ?, ?)
-        ''', (user_id, period_id, run_date))
+            INSERT INTO payroll_runs (user_id, period_id, run_date, run_type)
+            VALUES (?, ?, ?, ?)
+        ''', (user_id, period_id, run_date, run_type))
         run_id = c.lastrowid
         conn.commit()
         return True, run_id
     except Exception as e:
         return False, f"Error creating payroll run: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def save_payroll_details(run_id, employee_details):
-    conn = sqlite3.connect('payroll.db')
+    conn = get_connection()
     c = conn.cursor()
 
     try:
@@ -194,8 +453,9 @@ def save_payroll_details(run_id, employee_details):
                 run_id, employee_id, gross_pay, net_pay,
                 basic_salary, housing, transport, utility,
                 meal, clothing, pension_employee, pension_employer,
-                pension_voluntary, paye_tax, other_deductions, reimbursements
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                pension_voluntary, paye_tax, other_deductions, reimbursements,
+                calculation_trace, annual_gross_pay, working_days_ratio
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             run_id, employee_details['employee_id'],
             employee_details['gross_pay'], employee_details['net_pay'],
@@ -204,17 +464,511 @@ def save_payroll_details(run_id, employee_details):
             employee_details['meal'], employee_details['clothing'],
             employee_details['pension_employee'], employee_details['pension_employer'],
             employee_details['pension_voluntary'], employee_details['paye_tax'],
-            employee_details['other_deductions'], employee_details['reimbursements']
+            employee_details['other_deductions'], employee_details['reimbursements'],
+            employee_details.get('calculation_trace'), employee_details.get('annual_gross_pay'),
+            employee_details.get('working_days_ratio')
         ))
         conn.commit()
         return True, "Payroll details saved successfully"
     except Exception as e:
         return False, f"Error saving payroll details: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
+
+# payroll_details column -> calculator output column, for saving whole runs
+PAYROLL_DETAIL_COLUMNS = {
+    'gross_pay': 'PRORATED_MONTHLY_GROSS',
+    'net_pay': 'NET_PAY',
+    'basic_salary': 'COMP_BASIC',
+    'housing': 'COMP_HOUSING',
+    'transport': 'COMP_TRANSPORT',
+    'utility': 'COMP_UTILITY',
+    'meal': 'COMP_MEAL',
+    'clothing': 'COMP_CLOTHING',
+    'pension_employee': 'MANDATORY_PENSION',
+    'pension_employer': 'EMPLOYER_PENSION',
+    'pension_voluntary': 'VOLUNTARY_PENSION',
+    'paye_tax': 'PAYE_TAX',
+    'other_deductions': 'OTHER_DEDUCTIONS',
+    'reimbursements': 'REIMBURSEMENTS',
+    'annual_gross_pay': 'ANNUAL GROSS PAY',
+    'working_days_ratio': 'WORKING_DAYS_RATIO',
+}
+
+# Arrears included in a detail row's amounts (see arrears.apply_arrears), kept
+# so the payroll history can compare the regular pay alone; zero when absent
+PAYROLL_ARREARS_COLUMNS = {
+    'arrears_gross_pay': 'ARREARS_GROSS_PAY',
+    'arrears_pension_employee': 'ARREARS_PENSION_EMPLOYEE',
+    'arrears_pension_employer': 'ARREARS_PENSION_EMPLOYER',
+    'arrears_paye_tax': 'ARREARS_PAYE_TAX',
+    'arrears_net_pay': 'ARREARS_NET_PAY',
+    'arrears_taxable_pay': 'ARREARS_TAXABLE_PAY',
+}
+
+# Intermediate results kept so a saved run can be explained without
+# recalculating it (see get_payroll_trace); empty when absent
+PAYROLL_TRACE_COLUMNS = {
+    'contract_type': 'Contract Type',
+    'start_date': 'START DATE',
+    'end_date': 'END DATE',
+    'monthly_gross': 'MONTHLY_GROSS',
+    'cra': 'CRA',
+    'tax_relief': 'TAX_RELIEF',
+    'taxable_pay': 'TAXABLE_PAY',
+    'total_deductions': 'TOTAL_DEDUCTIONS',
+    'days_worked': 'DAYS_WORKED',
+    'days_in_month': 'DAYS_IN_MONTH',
+    'tax_period': 'TAX_PERIOD',
+    'previous_taxable': 'PREVIOUS_TAXABLE',
+    'previous_tax': 'PREVIOUS_TAX',
+}
+
+def _optional_values(frame, column):
+    """Plain values of an optional results column, None where it is absent or empty"""
+    if column not in frame.columns:
+        return [None] * len(frame)
+    return [None if value is None or value != value else value for value in frame[column].tolist()]
+
+def _payroll_detail_rows(run_id, frame):
+    """payroll_details parameters for a frame of results, built column by column"""
+    arrears = (
+        frame[column].to_numpy(dtype=float).tolist() if column in frame.columns else [0.0] * len(frame)
+        for column in PAYROLL_ARREARS_COLUMNS.values()
+    )
+    return zip(
+        [run_id] * len(frame),
+        map(int, frame['employee_id']),
+        *(frame[column].to_numpy(dtype=float).tolist() for column in PAYROLL_DETAIL_COLUMNS.values()),
+        *arrears,
+        *(_optional_values(frame, column) for column in PAYROLL_TRACE_COLUMNS.values()),
+        _optional_values(frame, 'CALCULATION_TRACE')
+    )
+
+def save_payroll_run(user_id, period_id, results, ytd=None, tax_year=None, rules=None, components=None):
+    """
+    Store a whole regular payroll run in one transaction
+
+    Either the run and every detail row are saved, or nothing is. Pending
+    arrears paid in the run (rows with an ARREARS_NET_PAY amount) are
+    marked as paid, and the year-to-date PAYE totals after the run are
+    stored, in the same transaction. The intermediate results in
+    PAYROLL_TRACE_COLUMNS are kept with each row, and the rules and
+    components with the run, so get_payroll_trace can explain it later.
+
+    Args:
+        user_id (int): Owner of the run
+        period_id (int): Payroll period being paid
+        results (pd.DataFrame or iterable of pd.DataFrame): Calculator output
+            with an 'employee_id' column, and optionally CALCULATION_TRACE
+            JSON, in one frame or as a stream of chunks
+        ytd (pd.DataFrame, optional): Running totals after the run, indexed by
+            employee_id, as from apply_ytd_paye
+        tax_year (int, optional): Tax year of the totals; required with ytd
+        rules (dict, optional): Statutory rules the run was paid under, as
+            from calculation_trace.rules_to_dict
+        components (dict, optional): Component percentages used
+
+    Returns:
+        tuple: (True, run_id) or (False, error message)
+    """
+    conn = get_connection()
+    c = conn.cursor()
+
+    try:
+        c.execute('''
+            INSERT INTO payroll_runs (user_id, period_id, run_date, run_type, rules, components)
+            VALUES (?, ?, ?, 'regular', ?, ?)
+        ''', (user_id, period_id, datetime.now().strftime('%Y-%m-%d'),
+              json.dumps(rules) if rules is not None else None,
+              json.dumps(components) if components is not None else None))
+        run_id = c.lastrowid
+
+        arrears_paid = []
+
+        def detail_rows():
+            frames = [results] if hasattr(results, 'columns') else results
+            for frame in frames:
+                if 'ARREARS_NET_PAY' in frame.columns:
+                    arrears_paid.extend(frame.loc[frame['ARREARS_NET_PAY'] != 0, 'employee_id'].tolist())
+                yield from _payroll_detail_rows(run_id, frame)
+
+        columns = [*PAYROLL_DETAIL_COLUMNS, *PAYROLL_ARREARS_COLUMNS, *PAYROLL_TRACE_COLUMNS]
+        c.executemany(f'''
+            INSERT INTO payroll_details (
+                run_id, employee_id, {', '.join(columns)}, calculation_trace
+            ) VALUES ({', '.join('?' * (len(columns) + 3))})
+        ''', detail_rows())
+
+        c.executemany('''
+            UPDATE payroll_arrears SET status = 'paid', paid_run_id = ?
+            WHERE user_id = ? AND employee_id = ? AND status = 'pending'
+        ''', [(run_id, user_id, int(employee_id)) for employee_id in arrears_paid])
+
+        if ytd is not None:
+            c.executemany(_UPSERT_PAYROLL_YTD, _payroll_ytd_rows(run_id, tax_year, ytd))
+
+        conn.commit()
+        return True, run_id
+    except Exception as e:
+        conn.rollback()
+        return False, f"Error saving payroll run: {str(e)}"
+    finally:
+        release_connection(conn)
+
+def save_off_cycle_run(user_id, period_id, payments):
+    """
+    Store an off-cycle run and its payments in one transaction
+
+    Args:
+        user_id (int): Owner of the run
+        period_id (int): Payroll period the payments belong to
+        payments (pd.DataFrame): Output of calculate_off_cycle with an
+            'employee_id' column
+
+    Returns:
+        tuple: (True, run_id) or (False, error message)
+    """
+    conn = get_connection()
+    c = conn.cursor()
+
+    try:
+        c.execute('''
+            INSERT INTO payroll_runs (user_id, period_id, run_date, run_type)
+            VALUES (?, ?, ?, 'off_cycle')
+        ''', (user_id, period_id, datetime.now().strftime('%Y-%m-%d')))
+        run_id = c.lastrowid
+
+        # One-off payments carry no salary components or pension
+        c.executemany('''
+            INSERT INTO payroll_details (
+                run_id, employee_id, gross_pay, net_pay,
+                basic_salary, housing, transport, utility,
+                meal, clothing, pension_employee, pension_employer,
+                pension_voluntary, paye_tax, other_deductions, reimbursements,
+                payment_type
+            ) VALUES (?, ?, ?, ?, 0, 0, 0, 0, 0, 0, 0, 0, 0, ?, 0, 0, ?)
+        ''', (
+            (run_id, int(row.employee_id), float(row.ONE_OFF_AMOUNT), float(row.NET_PAYMENT),
+             float(row.PAYE_TAX), row.payment_type)
+            for row in payments.rename(columns={'PAYMENT TYPE': 'payment_type'}).itertuples(index=False)
+        ))
+        conn.commit()
+        return True, run_id
+    except Exception as e:
+        conn.rollback()
+        return False, f"Error saving off-cycle run: {str(e)}"
+    finally:
+        release_connection(conn)
+
+def get_payroll_trace(run_id, employee_id):
+    """
+    Get what explains an employee's pay in a saved payroll run
+
+    Args:
+        run_id (int): Saved payroll run
+        employee_id (int): Employee paid in the run
+
+    Returns:
+        dict: The stored trace, or one without steps built from the stored
+            amounts, rules and components, for CalculationTrace.from_dict;
+            None when the run stored neither
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+
+    c.execute('''
+        SELECT d.*, r.rules, r.components
+        FROM payroll_details d
+        JOIN payroll_runs r ON r.id = d.run_id
+        WHERE d.run_id = ? AND d.employee_id = ?
+    ''', (run_id, employee_id))
+    row = c.fetchone()
+
+    release_connection(conn)
+    if row is None:
+        return None
+    if row['calculation_trace']:
+        return json.loads(row['calculation_trace'])
+    if row['rules'] is None:
+        return None
+
+    columns = {**PAYROLL_DETAIL_COLUMNS, **PAYROLL_ARREARS_COLUMNS, **PAYROLL_TRACE_COLUMNS}
+    return {
+        'rules': json.loads(row['rules']),
+        'components': json.loads(row['components']) if row['components'] else None,
+        'working_days': [row['days_worked'], row['days_in_month']] if row['days_worked'] is not None else None,
+        'result': {column: row[name] for name, column in columns.items()}
+    }
+
+def get_payroll_history(user_id, employee_ids, since):
+    """
+    Get stored regular payroll details for periods ending on or after a date
+
+    Rejected runs are left out. Arrears paid in a run are taken back out
+    of its amounts and arrears recorded for a period are added to it, so
+    each row is what has been settled for its own period. Each row carries
+    the period dates, the contract type it was paid under, the employee's
+    start date and the year-to-date PAYE totals it started from, as used by
+    calculate_arrears.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+
+    employee_ids = [int(employee_id) for employee_id in employee_ids]
+    placeholders = ', '.join('?' * len(employee_ids))
+    c.execute(f'''
+        SELECT d.run_id, d.employee_id, r.period_id,
+               p.start_date AS period_start, p.end_date AS period_end,
+               COALESCE(d.contract_type, e.contract_type) AS contract_type, e.start_date AS employee_start_date,
+               d.annual_gross_pay, d.working_days_ratio,
+               d.gross_pay - COALESCE(d.arrears_gross_pay, 0) + COALESCE(a.gross_pay, 0) AS gross_pay,
+               d.net_pay - COALESCE(d.arrears_net_pay, 0) + COALESCE(a.net_pay, 0) AS net_pay,
+               d.pension_employee - COALESCE(d.arrears_pension_employee, 0)
+                   + COALESCE(a.pension_employee, 0) AS pension_employee,
+               d.pension_employer - COALESCE(d.arrears_pension_employer, 0)
+                   + COALESCE(a.pension_employer, 0) AS pension_employer,
+               d.pension_voluntary,
+               d.paye_tax - COALESCE(d.arrears_paye_tax, 0) + COALESCE(a.paye_tax, 0) AS paye_tax,
+               d.other_deductions, d.reimbursements,
+               d.taxable_pay - COALESCE(d.arrears_taxable_pay, 0) + COALESCE(a.taxable_pay, 0) AS taxable_pay,
+               d.tax_period, d.previous_taxable, d.previous_tax
+        FROM payroll_details d
+        JOIN payroll_runs r ON r.id = d.run_id
+        JOIN payroll_periods p ON p.id = r.period_id
+        JOIN employees e ON e.id = d.employee_id
+        LEFT JOIN (
+            SELECT employee_id, period_id, SUM(gross_pay) AS gross_pay, SUM(net_pay) AS net_pay,
+                   SUM(pension_employee) AS pension_employee, SUM(pension_employer) AS pension_employer,
+                   SUM(paye_tax) AS paye_tax, SUM(taxable_pay) AS taxable_pay
+            FROM payroll_arrears
+            WHERE user_id = ? AND period_id IS NOT NULL
+            GROUP BY employee_id, period_id
+        ) a ON a.employee_id = d.employee_id AND a.period_id = r.period_id
+        WHERE r.user_id = ? AND r.run_type = 'regular' AND r.status != 'rejected'
+          AND p.end_date >= ? AND d.employee_id IN ({placeholders})
+    ''', (user_id, user_id, since, *employee_ids))
+    history = [dict(row) for row in c.fetchall()]
+
+    release_connection(conn)
+    return history
+
+def save_payroll_arrears(user_id, arrears, periods=None):
+    """
+    Store arrears owed for backdated pay changes and apply the new pay
+
+    Args:
+        user_id (int): Owner of the employees
+        arrears (pd.DataFrame): Output of calculate_arrears, indexed by employee_id
+        periods (pd.DataFrame, optional): Output of period_arrears for the same
+            changes; the arrears are then stored per period, so a later change
+            to the same periods only owes the remaining difference
+
+    Returns:
+        tuple: (success, message)
+    """
+    conn = get_connection()
+    c = conn.cursor()
+
+    try:
+        rows = [
+            (user_id, int(employee_id), None, str(row.effective_date)[:10], float(row.new_annual_gross),
+             int(row.periods), float(row.gross_pay), float(row.pension_employee),
+             float(row.pension_employer), float(row.paye_tax), float(row.net_pay), float(row.taxable_pay))
+            for employee_id, row in zip(arrears.index, arrears.itertuples(index=False))
+        ]
+        if periods is None:
+            arrears_rows = [row for row in rows if row[5]]
+        else:
+            arrears_rows = [
+                (user_id, int(row.employee_id), int(row.period_id), str(row.effective_date)[:10],
+                 float(row.new_annual_gross), 1, float(row.gross_pay), float(row.pension_employee),
+                 float(row.pension_employer), float(row.paye_tax), float(row.net_pay), float(row.taxable_pay))
+                for row in periods.itertuples(index=False)
+            ]
+        c.executemany('''
+            INSERT INTO payroll_arrears (
+                user_id, employee_id, period_id, effective_date, new_annual_gross, periods,
+                gross_pay, pension_employee, pension_employer, paye_tax, net_pay, taxable_pay
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', arrears_rows)
+        c.executemany('UPDATE employees SET annual_gross_pay = ? WHERE id = ? AND user_id = ?',
+                      [(row[4], row[1], user_id) for row in rows])
+        conn.commit()
+        return True, f"Pay changes applied and arrears recorded for {sum(1 for row in rows if row[5])} employees"
+    except Exception as e:
+        conn.rollback()
+        return False, f"Error saving arrears: {str(e)}"
+    finally:
+        release_connection(conn)
+
+def get_pending_arrears(user_id):
+    """Get unpaid arrears totals per employee, keyed by employee_id"""
+    conn = get_connection()
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+
+    c.execute('''
+        SELECT employee_id, SUM(periods) AS periods, SUM(gross_pay) AS gross_pay,
+               SUM(pension_employee) AS pension_employee, SUM(pension_employer) AS pension_employer,
+               SUM(paye_tax) AS paye_tax, SUM(net_pay) AS net_pay, SUM(taxable_pay) AS taxable_pay
+        FROM payroll_arrears
+        WHERE user_id = ? AND status = 'pending'
+        GROUP BY employee_id
+    ''', (user_id,))
+    arrears = {row['employee_id']: dict(row) for row in c.fetchall()}
+
+    release_connection(conn)
+    return arrears
+
+def mark_arrears_paid(user_id, run_id, employee_ids):
+    """Mark employees' pending arrears as paid in a payroll run"""
+    conn = get_connection()
+    c = conn.cursor()
+
+    try:
+        c.executemany('''
+            UPDATE payroll_arrears SET status = 'paid', paid_run_id = ?
+            WHERE user_id = ? AND employee_id = ? AND status = 'pending'
+        ''', [(run_id, user_id, int(employee_id)) for employee_id in employee_ids])
+        conn.commit()
+        return True, "Arrears marked as paid"
+    except Exception as e:
+        conn.rollback()
+        return False, f"Error updating arrears: {str(e)}"
+    finally:
+        release_connection(conn)
+
+def get_payroll_ytd(employee_ids, tax_year):
+    """Get cumulative PAYE running totals for employees in a tax year"""
+    conn = get_connection()
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+
+    employee_ids = [int(employee_id) for employee_id in employee_ids]
+    placeholders = ', '.join('?' * len(employee_ids))
+    c.execute(f'''
+        SELECT y.employee_id, y.months_paid, y.cumulative_gross, y.cumulative_relief,
+               y.cumulative_taxable, y.cumulative_tax, y.last_run_id, p.end_date AS last_period_end
+        FROM payroll_ytd y
+        LEFT JOIN payroll_runs r ON r.id = y.last_run_id
+        LEFT JOIN payroll_periods p ON p.id = r.period_id
+        WHERE y.tax_year = ? AND y.employee_id IN ({placeholders})
+    ''', (tax_year, *employee_ids))
+    totals = {row['employee_id']: dict(row) for row in c.fetchall()}
+
+    release_connection(conn)
+    return totals
+
+_UPSERT_PAYROLL_YTD = '''
+    INSERT INTO payroll_ytd (
+        employee_id, tax_year, months_paid, cumulative_gross,
+        cumulative_relief, cumulative_taxable, cumulative_tax, last_run_id
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (employee_id, tax_year) DO UPDATE SET
+        months_paid = excluded.months_paid,
+        cumulative_gross = excluded.cumulative_gross,
+        cumulative_relief = excluded.cumulative_relief,
+        cumulative_taxable = excluded.cumulative_taxable,
+        cumulative_tax = excluded.cumulative_tax,
+        last_run_id = excluded.last_run_id,
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+def _payroll_ytd_rows(run_id, tax_year, ytd):
+    """payroll_ytd parameters for running totals indexed by employee_id"""
+    return (
+        (int(employee_id), tax_year, int(row.months_paid), float(row.cumulative_gross),
+         float(row.cumulative_relief), float(row.cumulative_taxable),
+         float(row.cumulative_tax), run_id)
+        for employee_id, row in zip(ytd.index, ytd.itertuples(index=False))
+    )
+
+def save_payroll_ytd(run_id, tax_year, ytd):
+    """
+    Store cumulative PAYE running totals after a payroll period
+
+    Args:
+        run_id (int): Payroll run that produced the totals
+        tax_year (int): Tax year the totals belong to
+        ytd (pd.DataFrame): Totals indexed by employee_id, as from apply_ytd_paye
+    """
+    conn = get_connection()
+    c = conn.cursor()
+
+    try:
+        c.executemany(_UPSERT_PAYROLL_YTD, _payroll_ytd_rows(run_id, tax_year, ytd))
+        conn.commit()
+        return True, "Year-to-date totals saved successfully"
+    except Exception as e:
+        conn.rollback()
+        return False, f"Error saving year-to-date totals: {str(e)}"
+    finally:
+        release_connection(conn)
+
+def _statutory_rules_row(effective_from, tax_bands, *rates):
+    """Database row for a rule version; the open top band is stored as null"""
+    bands = [[None if width == float('inf') else width, rate] for width, rate in tax_bands]
+    return (str(effective_from), json.dumps(bands), *rates)
+
+def get_statutory_rules():
+    """Get every stored statutory rule version, oldest first"""
+    conn = get_connection()
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+
+    c.execute('SELECT * FROM statutory_rules ORDER BY effective_from')
+    versions = []
+    for row in c.fetchall():
+        version = dict(row)
+        version['tax_bands'] = tuple(
+            (float('inf') if width is None else width, rate)
+            for width, rate in json.loads(version['tax_bands'])
+        )
+        versions.append(version)
+
+    release_connection(conn)
+    return versions
+
+def save_statutory_rules(effective_from, tax_bands, employee_pension_rate, employer_pension_rate,
+                         pension_threshold, cra_percent_rate, cra_minimum_rate, cra_annual_floor):
+    """
+    Store a new statutory rule version
+
+    Args:
+        effective_from (str): First pay date the version applies to, YYYY-MM-DD
+        tax_bands (list): Annual PAYE bands as (band width, rate), the last width infinite
+        employee_pension_rate, employer_pension_rate (float): Pension rates, e.g. 0.08
+        pension_threshold (float): Monthly gross below which no pension is deducted
+        cra_percent_rate, cra_minimum_rate (float): CRA rates, e.g. 0.2 and 0.01
+        cra_annual_floor (float): Annual minimum relief
+    """
+    conn = get_connection()
+    c = conn.cursor()
+
+    try:
+        c.execute('''
+            INSERT INTO statutory_rules (
+                effective_from, tax_bands, employee_pension_rate, employer_pension_rate,
+                pension_threshold, cra_percent_rate, cra_minimum_rate, cra_annual_floor
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', _statutory_rules_row(
+            effective_from, tax_bands, employee_pension_rate, employer_pension_rate,
+            pension_threshold, cra_percent_rate, cra_minimum_rate, cra_annual_floor
+        ))
+        conn.commit()
+        return True, "Statutory rules saved successfully"
+    except sqlite3.IntegrityError:
+        return False, f"Rules effective from {effective_from} already exist"
+    except Exception as e:
+        return False, f"Error saving statutory rules: {str(e)}"
+    finally:
+        release_connection(conn)
 
 def update_payroll_run_status(run_id, status, user_id, approver=None):
-    conn = sqlite3.connect('payroll.db')
+    conn = get_connection()
     c = conn.cursor()
 
     try:
@@ -242,21 +996,21 @@ def update_payroll_run_status(run_id, status, user_id, approver=None):
     except Exception as e:
         return False, f"Error updating payroll run status: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_employee_by_id(employee_id, user_id):
-    conn = sqlite3.connect('payroll.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_connection()
     c = conn.cursor()
+    c.row_factory = sqlite3.Row
 
     c.execute('SELECT * FROM employees WHERE id = ? AND user_id = ?', (employee_id, user_id))
     employee = c.fetchone()
 
-    conn.close()
+    release_connection(conn)
     return dict(employee) if employee else None
 
 def add_employee(employee_data, user_id):
-    conn = sqlite3.connect('payroll.db')
+    conn = get_connection()
     c = conn.cursor()
 
     try:
@@ -332,30 +1086,288 @@ def add_employee(employee_data, user_id):
             return True, "Employee added successfully"
 
     except sqlite3.IntegrityError as e:
-        if "staff_id" in str(e):
-            return False, f"Error: Duplicate staff ID found"
-        elif "email" in str(e):
-            return False, f"Error: Email address already exists"
-        return False, f"Error: Duplicate entry found"
+        return False, _employee_integrity_message(e)
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
+
+def _employee_integrity_message(error):
+    """User-facing message for a constraint failure on the employees table"""
+    if "staff_id" in str(error):
+        return "Error: Duplicate staff ID found"
+    elif "email" in str(error):
+        return "Error: Email address already exists"
+    return "Error: Duplicate entry found"
+
+# Employee columns written by add_employee and upsert_employees, after user_id
+EMPLOYEE_COLUMNS = [
+    'staff_id', 'email', 'full_name', 'department', 'job_title', 'annual_gross_pay',
+    'start_date', 'end_date', 'contract_type', 'reimbursements', 'other_deductions',
+    'voluntary_pension', 'rsa_pin', 'account_number'
+]
+
+_UPSERT_EMPLOYEE = f'''
+    INSERT INTO employees (user_id, {', '.join(EMPLOYEE_COLUMNS)})
+    VALUES ({', '.join('?' * (len(EMPLOYEE_COLUMNS) + 1))})
+    ON CONFLICT (user_id, staff_id) DO UPDATE SET
+        {', '.join(f'{column} = excluded.{column}' for column in EMPLOYEE_COLUMNS[1:])}
+'''
+
+def _employee_values(employee_data, user_id):
+    """Parameters for _UPSERT_EMPLOYEE, with add_employee's defaults"""
+    return (
+        user_id,
+        employee_data['staff_id'],
+        employee_data['email'],
+        employee_data['full_name'],
+        employee_data['department'],
+        employee_data['job_title'],
+        employee_data['annual_gross_pay'],
+        employee_data['start_date'],
+        employee_data.get('end_date'),
+        employee_data['contract_type'],
+        employee_data.get('reimbursements', 0),
+        employee_data.get('other_deductions', 0),
+        employee_data.get('voluntary_pension', 0),
+        employee_data.get('rsa_pin'),
+        employee_data['account_number']
+    )
+
+def upsert_employees(employees, user_id):
+    """
+    Add or update many employees in one transaction, matched on staff ID
+
+    Rows are checked in order against the staff IDs and emails already
+    stored, so the counts and row errors match calling add_employee row by
+    row, and the valid rows are then written with a single executemany.
+
+    Args:
+        employees (iterable): (row label, employee_data) pairs, employee_data as for add_employee
+        user_id (int): Owner of the employees
+
+    Returns:
+        tuple: (True, {'added', 'updated', 'errors'}) with errors as
+            (row label, message) pairs, or (False, error message)
+    """
+    conn = get_connection()
+    c = conn.cursor()
+
+    try:
+        c.execute('SELECT staff_id, email FROM employees WHERE user_id = ?', (user_id,))
+        email_by_staff_id = dict(c.fetchall())
+        staff_id_by_email = {email: staff_id for staff_id, email in email_by_staff_id.items()}
+
+        result = {'added': 0, 'updated': 0, 'errors': []}
+        rows = []
+        for label, employee_data in employees:
+            try:
+                values = _employee_values(employee_data, user_id)
+            except Exception as e:
+                result['errors'].append((label, f"Error: {str(e)}"))
+                continue
+
+            staff_id, email = values[1], values[2]
+            owner = staff_id_by_email.get(email)
+            if owner is not None and owner != staff_id:
+                result['errors'].append((label, "Error: Email address already exists"))
+                continue
+
+            if staff_id in email_by_staff_id:
+                result['updated'] += 1
+                staff_id_by_email.pop(email_by_staff_id[staff_id], None)
+            else:
+                result['added'] += 1
+            email_by_staff_id[staff_id] = email
+            staff_id_by_email[email] = staff_id
+            rows.append((label, values))
+
+        try:
+            c.executemany(_UPSERT_EMPLOYEE, [values for _, values in rows])
+        except sqlite3.IntegrityError:
+            # A row broke a constraint the checks above do not cover: write the
+            # rows one at a time in the same transaction to find which
+            conn.rollback()
+            result = _upsert_employees_rowwise(c, rows, user_id, result['errors'])
+
+        conn.commit()
+        return True, result
+    except Exception as e:
+        conn.rollback()
+        return False, f"Error saving employees: {str(e)}"
+    finally:
+        release_connection(conn)
+
+def _upsert_employees_rowwise(c, rows, user_id, errors):
+    """Write checked upsert rows one statement at a time, collecting row errors"""
+    c.execute('SELECT staff_id FROM employees WHERE user_id = ?', (user_id,))
+    existing = {staff_id for staff_id, in c.fetchall()}
+
+    result = {'added': 0, 'updated': 0, 'errors': list(errors)}
+    for label, values in rows:
+        try:
+            c.execute(_UPSERT_EMPLOYEE, values)
+        except sqlite3.IntegrityError as e:
+            result['errors'].append((label, _employee_integrity_message(e)))
+            continue
+        result['updated' if values[1] in existing else 'added'] += 1
+        existing.add(values[1])
+    return result
 
 def get_all_employees(user_id):
-    conn = sqlite3.connect('payroll.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_connection()
     c = conn.cursor()
+    c.row_factory = sqlite3.Row
 
     c.execute('SELECT * FROM employees WHERE user_id = ? ORDER BY created_at DESC', (user_id,))
     employees = [dict(row) for row in c.fetchall()]
 
-    conn.close()
+    release_connection(conn)
+    return employees
+
+def _employee_filters(user_id, department=None, contract_type=None, min_salary=None, max_salary=None,
+                      name_prefix=None):
+    """WHERE clause and parameters for a user's employees matching the list filters"""
+    clauses = ['user_id = ?']
+    params = [user_id]
+    if department:
+        clauses.append('department = ?')
+        params.append(department)
+    if contract_type:
+        # Matched the way the calculator reads it, ignoring case and padding
+        clauses.append('UPPER(TRIM(contract_type)) = ?')
+        params.append(contract_type.strip().upper())
+    if min_salary is not None:
+        clauses.append('annual_gross_pay >= ?')
+        params.append(min_salary)
+    if max_salary is not None:
+        clauses.append('annual_gross_pay <= ?')
+        params.append(max_salary)
+    if name_prefix:
+        escaped = name_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        clauses.append("full_name LIKE ? ESCAPE '\\'")
+        params.append(escaped + '%')
+    return ' AND '.join(clauses), params
+
+def query_employees(user_id, page_size=50, after=None, **filters):
+    """
+    Get one page of a user's employees, newest first, using keyset pagination
+
+    Pages continue from the last row of the previous page instead of using
+    an OFFSET, so every page costs the same however deep it is.
+
+    Args:
+        user_id (int): Owner of the employees
+        page_size (int, optional): Employees per page
+        after (tuple, optional): Cursor returned with the previous page
+        **filters: department, contract_type, min_salary, max_salary and name_prefix
+
+    Returns:
+        tuple: (list of employee dicts, cursor for the next page or None on the last page)
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+
+    where, params = _employee_filters(user_id, **filters)
+    if after is not None:
+        where += ' AND (created_at, id) < (?, ?)'
+        params.extend(after)
+
+    c.execute(f'''
+        SELECT * FROM employees
+        WHERE {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    ''', (*params, page_size + 1))
+    employees = [dict(row) for row in c.fetchall()]
+
+    release_connection(conn)
+    if len(employees) <= page_size:
+        return employees, None
+    employees = employees[:page_size]
+    return employees, (employees[-1]['created_at'], employees[-1]['id'])
+
+def count_employees(user_id, **filters):
+    """Count a user's employees matching the same filters as query_employees"""
+    conn = get_connection()
+    c = conn.cursor()
+
+    where, params = _employee_filters(user_id, **filters)
+    c.execute(f'SELECT COUNT(*) FROM employees WHERE {where}', params)
+    count = c.fetchone()[0]
+
+    release_connection(conn)
+    return count
+
+def get_employee_departments(user_id):
+    """Get the distinct departments of a user's employees, for list filters"""
+    conn = get_connection()
+    c = conn.cursor()
+
+    c.execute('SELECT DISTINCT department FROM employees WHERE user_id = ? ORDER BY department', (user_id,))
+    departments = [row[0] for row in c.fetchall()]
+
+    release_connection(conn)
+    return departments
+
+def _employee_search_query(text):
+    """
+    FTS5 query matching every term of free text as a prefix, e.g. 'ada fin' -> '"ada"* "fin"*'
+
+    Each term is quoted, with embedded quotes doubled, so punctuation and
+    FTS5 operators in the search are matched as text, not parsed as syntax.
+    """
+    return ' '.join('"' + term.replace('"', '""') + '"*' for term in text.split())
+
+def search_employees(user_id, text, limit=20, **filters):
+    """
+    Search a user's employees by name, email, staff ID, department and job title
+
+    Every word of the search must start a word in one of those fields, so
+    partial names, staff ID prefixes and email fragments all match.
+
+    Args:
+        user_id (int): Owner of the employees
+        text (str): Free-text search
+        limit (int, optional): Most matches to return
+        **filters: department, contract_type, min_salary, max_salary and name_prefix,
+            as for query_employees
+
+    Returns:
+        list: Matching employee dicts, best match first
+
+    Raises:
+        sqlite3.OperationalError: If the search cannot run, e.g. SQLite lacks FTS5
+    """
+    query = _employee_search_query(text)
+    if not query:
+        return []
+
+    conn = get_connection()
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+
+    where, params = _employee_filters(user_id, **filters)
+    try:
+        c.execute(f'''
+            WITH matches AS (
+                SELECT rowid, rank FROM employees_fts WHERE employees_fts MATCH ?
+            )
+            SELECT employees.* FROM matches
+            JOIN employees ON employees.id = matches.rowid
+            WHERE {where}
+            ORDER BY matches.rank
+            LIMIT ?
+        ''', (query, *params, limit))
+        employees = [dict(row) for row in c.fetchall()]
+    finally:
+        release_connection(conn)
     return employees
 
 def generate_staff_id(user_id):
     """Generate a unique staff ID"""
-    conn = sqlite3.connect('payroll.db')
+    conn = get_connection()
     c = conn.cursor()
 
     # Get current year
@@ -372,14 +1384,14 @@ def generate_staff_id(user_id):
     else:
         new_id = 1
 
-    conn.close()
+    release_connection(conn)
     return f'EMP{year}{new_id:04d}'  # Format: EMP230001
 
 # Add this function after get_all_employees()
 
 def delete_employee(employee_id, user_id):
     """Delete an employee from the database"""
-    conn = sqlite3.connect('payroll.db')
+    conn = get_connection()
     c = conn.cursor()
 
     try:
@@ -405,12 +1417,12 @@ def delete_employee(employee_id, user_id):
     except Exception as e:
         return False, f"Error deleting employee: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 # User Authentication Functions
 def register_user(username, email, password, full_name, company_name=None):
     """Register a new user"""
-    conn = sqlite3.connect('payroll.db')
+    conn = get_connection()
     c = conn.cursor()
 
     try:
@@ -437,13 +1449,13 @@ def register_user(username, email, password, full_name, company_name=None):
     except Exception as e:
         return False, f"Registration error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def login_user(username, password):
     """Authenticate a user"""
-    conn = sqlite3.connect('payroll.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_connection()
     c = conn.cursor()
+    c.row_factory = sqlite3.Row
 
     try:
         c.execute('SELECT * FROM users WHERE username = ?', (username,))
@@ -461,13 +1473,13 @@ def login_user(username, password):
     except Exception as e:
         return False, f"Login error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_user_by_id(user_id):
     """Get user information by ID"""
-    conn = sqlite3.connect('payroll.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_connection()
     c = conn.cursor()
+    c.row_factory = sqlite3.Row
 
     try:
         c.execute('SELECT id, username, email, full_name, company_name, created_at FROM users WHERE id = ?', (user_id,))
@@ -476,4 +1488,4 @@ def get_user_by_id(user_id):
     except Exception:
         return None
     finally:
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
\ No newline at end of file
@@ -0,0 +1,305 @@
+"""
+Differential equivalence checks between the reference and optimized calculators
+
+The reference is ``SalaryCalculator.process_employee``, one employee at a
+time. Every other engine must produce the same amounts for the same inputs.
+
+    python equivalence.py --rows 1000000 --workers 8
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product, repeat
+
+import numpy as np
+import pandas as pd
+
+from bulk_processing import process_dataframe_parallel
+from calculation_cache import CalculationCache
+from salary_calculator import SalaryCalculator, CALCULATED_COLUMNS, DEFAULT_COMPONENTS, OUTPUT_COLUMNS
+from workforce_generator import DEFAULT_PAY_MONTH, generate_workforce
+
+# Columns that fully determine an employee's calculated amounts
+INPUT_COLUMNS = [
+    'ANNUAL GROSS PAY', 'START DATE', 'END DATE', 'Contract Type',
+    'VOLUNTARY_PENSION', 'Reimbursements', 'Other Deductions'
+]
+
+# Unique employees sent to each reference worker at a time
+REFERENCE_CHUNK_SIZE = 5000
+
+
+def _workforce_frame(annual_gross, start_dates, end_dates, contract_types, voluntary_pension,
+                     reimbursements, other_deductions):
+    """Assemble input arrays into a bulk upload dataframe with placeholder identities."""
+    ids = np.arange(1, len(annual_gross) + 1).astype(str)
+    return pd.DataFrame({
+        'Account Number': np.char.zfill(ids, 10),
+        'STAFF ID': np.char.add('TST', ids),
+        'Email': np.char.add(ids, '@test.invalid'),
+        'NAME': np.char.add('Test ', ids),
+        'DEPARTMENT': 'Test',
+        'JOB TITLE': 'Test',
+        'ANNUAL GROSS PAY': np.asarray(annual_gross, dtype=float),
+        'START DATE': start_dates,
+        'END DATE': end_dates,
+        'Contract Type': contract_types,
+        'Reimbursements': np.asarray(reimbursements, dtype=float),
+        'Other Deductions': np.asarray(other_deductions, dtype=float),
+        'VOLUNTARY_PENSION': np.asarray(voluntary_pension, dtype=float)
+    })
+
+
+def random_workforce(rows, seed=0):
+    """
+    Randomized employees spread well beyond a realistic payroll.
+
+    Pay runs from a few thousand naira to hundreds of millions, with many
+    amounts carrying kobo; pay periods fall anywhere from 2015 to 2030 and
+    cover anything from one day to a whole month.
+    """
+    rng = np.random.default_rng(seed)
+    annual_gross = np.exp(rng.uniform(np.log(10000), np.log(500000000), rows))
+    annual_gross = np.where(rng.random(rows) < 0.5, np.round(annual_gross, 2), np.round(annual_gross))
+
+    months = np.datetime64('2015-01', 'M') + rng.integers(0, 16 * 12, rows)
+    month_start = months.astype('datetime64[D]')
+    month_days = ((months + 1).astype('datetime64[D]') - month_start).astype(int)
+    end_offset = np.where(rng.random(rows) < 0.7, month_days - 1, rng.integers(0, month_days))
+    start_offset = np.where(rng.random(rows) < 0.6, 0, rng.integers(0, end_offset + 1))
+    start_offset = np.where(rng.random(rows) < 0.05, -rng.integers(1, 3000, rows), start_offset)
+    start_dates = np.datetime_as_string(month_start + start_offset, unit='D')
+    end_dates = np.datetime_as_string(month_start + end_offset, unit='D')
+
+    def sometimes(share, low, high):
+        return np.where(rng.random(rows) < share, np.round(rng.uniform(low, high, rows), 2), 0.0)
+
+    return _workforce_frame(
+        annual_gross, start_dates, end_dates,
+        rng.choice(['Full Time', 'Contract', 'CONTRACT', ' contract ', 'full time'], rows),
+        sometimes(0.3, 0, 200000), sometimes(0.3, 0, 100000), sometimes(0.3, 0, 100000)
+    )
+
+
+def _band_edge_grosses(calculator, pay_month):
+    """Full-month annual gross pay placing taxable pay on each PAYE band edge."""
+    monthly_gross = np.arange(30000.0, 2000000.0, 0.5)
+    columns = calculator.calculate_columns(
+        monthly_gross * 12, np.ones(len(monthly_gross)), np.zeros(len(monthly_gross), dtype=bool),
+        np.zeros(len(monthly_gross)), np.zeros(len(monthly_gross)), np.zeros(len(monthly_gross)),
+        rules=calculator.rule_book.for_date(pay_month)
+    )
+    thresholds = calculator.rule_book.for_date(pay_month).tax_table.thresholds[1:]
+    crossings = np.searchsorted(columns['TAXABLE_PAY'] * 12, thresholds)
+    steps = np.arange(-2, 3)
+    return np.unique((monthly_gross[np.clip(crossings[:, None] + steps, 0, len(monthly_gross) - 1)] * 12).ravel())
+
+
+def edge_case_workforce(calculator=None, pay_month=DEFAULT_PAY_MONTH):
+    """
+    Employees built around the boundaries where the rules change behaviour.
+
+    Covers prorated monthly pay either side of the pension threshold
+    (including half-kobo amounts) for each pay period, CONTRACT staff in several
+    spellings, pay periods with no working days, taxable pay on each PAYE
+    band edge and pay deep in the top band, each with and without voluntary
+    pension.
+
+    Args:
+        calculator (SalaryCalculator, optional): Calculator whose rules define
+            the thresholds; defaults to the standard components
+        pay_month (str, optional): Month being paid, as YYYY-MM
+    """
+    calculator = calculator or SalaryCalculator(DEFAULT_COMPONENTS)
+    threshold = calculator.rule_book.for_date(pay_month).pension_threshold
+
+    # Pay periods: whole month, first or last day only, half month,
+    # weekend-only and a start before the month
+    month_start = np.datetime64(pay_month, 'M').astype('datetime64[D]')
+    month_end = (np.datetime64(pay_month, 'M') + 1).astype('datetime64[D]') - 1
+    first_saturday = np.busday_offset(month_start, 0, roll='forward', weekmask='0000010')
+    periods = [
+        (month_start, month_end),
+        (month_start, month_start),
+        (month_end, month_end),
+        (month_start + 14, month_end),
+        (month_start, month_start + 14),
+        (first_saturday, first_saturday),
+        (first_saturday, first_saturday + 1),
+        (month_start - 30, month_end),
+    ]
+    ratios = calculator.calculate_working_days_ratios([start for start, _ in periods], [end for _, end in periods])
+
+    # Prorated monthly pay either side of the pension threshold, including half kobo
+    offsets = np.array([-1.0, -0.01, -0.005, 0.0, 0.005, 0.01, 1.0])
+    common_grosses = np.concatenate([
+        _band_edge_grosses(calculator, pay_month),
+        [0.0, 0.12, 1.0, 360000.06, 4e7, 1e8, 1e9, 123456789.99]
+    ])
+
+    contract_types = ['Full Time', 'Contract', 'CONTRACT', ' contract ']
+    voluntary = [0.0, 5000.0, 0.005]
+
+    cases = []
+    for (start_date, end_date), ratio in zip(periods, ratios):
+        grosses = common_grosses
+        if ratio > 0:
+            grosses = np.concatenate([np.round((threshold + offsets) / ratio * 12, 2), grosses])
+        cases.extend(
+            (gross, str(start_date), str(end_date), contract_type, voluntary_pension)
+            for gross, contract_type, voluntary_pension in product(grosses, contract_types, voluntary)
+        )
+
+    return _workforce_frame(
+        [case[0] for case in cases],
+        [case[1] for case in cases],
+        [case[2] for case in cases],
+        [case[3] for case in cases],
+        [case[4] for case in cases],
+        [2500.5 if i % 2 else 0.0 for i in range(len(cases))],
+        [1000.25 if i % 3 else 0.0 for i in range(len(cases))]
+    )
+
+
+def _reference_chunk(calculator, records):
+    """Run unique employees through the scalar reference path in a worker."""
+    return [
+        [result[column] for column in CALCULATED_COLUMNS]
+        for result in map(calculator.process_employee, records)
+    ]
+
+
+def reference_results(calculator, df, workers=None, chunk_size=REFERENCE_CHUNK_SIZE):
+    """
+    Calculate a dataframe with the scalar reference path.
+
+    Employees with identical calculation inputs are calculated once, and the
+    unique employees are spread across a process pool.
+
+    Returns:
+        pd.DataFrame: CALCULATED_COLUMNS in input row order
+    """
+    groups = df.groupby(INPUT_COLUMNS, sort=False, dropna=False).ngroup().to_numpy()
+    _, first_rows = np.unique(groups, return_index=True)
+    unique = df.iloc[first_rows].to_dict('records')
+    chunks = [unique[start:start + chunk_size] for start in range(0, len(unique), chunk_size)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) <= 1:
+        amounts = [row for chunk in chunks for row in _reference_chunk(calculator, chunk)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            amounts = [row for rows in pool.map(_reference_chunk, repeat(calculator), chunks) for row in rows]
+
+    unique_amounts = np.array(amounts, dtype=float).reshape(len(unique), len(CALCULATED_COLUMNS))
+    return pd.DataFrame(unique_amounts[groups], columns=CALCULATED_COLUMNS)
+
+
+def find_mismatches(reference, candidate, tolerance=0.0):
+    """
+    List every calculated amount that differs by more than the tolerance.
+
+    Args:
+        reference (pd.DataFrame): Reference results
+        candidate (pd.DataFrame): Results from the engine under test, same row order
+        tolerance (float, optional): Largest accepted absolute difference in naira
+
+    Returns:
+        pd.DataFrame: One row per mismatch with row, column, both values and the difference
+    """
+    mismatches = []
+    for column in CALCULATED_COLUMNS:
+        expected = reference[column].to_numpy(dtype=float)
+        actual = candidate[column].to_numpy(dtype=float)
+        difference = actual - expected
+        rows = np.flatnonzero(~(np.abs(difference) <= tolerance))
+        if len(rows):
+            mismatches.append(pd.DataFrame({
+                'row': rows,
+                'column': column,
+                'reference': expected[rows],
+                'candidate': actual[rows],
+                'difference': difference[rows]
+            }))
+    if not mismatches:
+        return pd.DataFrame(columns=['row', 'column', 'reference', 'candidate', 'difference'])
+    return pd.concat(mismatches, ignore_index=True)
+
+
+def default_engines(components=DEFAULT_COMPONENTS, calendar=None, workers=None):
+    """Optimized engines checked against the reference, by name."""
+    def cached(df):
+        calculator = SalaryCalculator(components, calendar, cache=CalculationCache(max_entries=len(df) + 1))
+        calculator.process_dataframe(df)
+        # The second run is served from the cache
+        return calculator.process_dataframe(df)
+
+    return {
+        'process_dataframe': SalaryCalculator(components, calendar).process_dataframe,
+        'process_dataframe_parallel': lambda df: process_dataframe_parallel(
+            SalaryCalculator(components, calendar), df, workers
+        ),
+        'cached': cached,
+    }
+
+
+def check_equivalence(df, engines=None, components=DEFAULT_COMPONENTS, calendar=None,
+                      tolerance=0.0, workers=None):
+    """
+    Run a workforce through the reference and each optimized engine.
+
+    Args:
+        df (pd.DataFrame): Employees in the bulk upload format
+        engines (dict, optional): Engine name -> callable taking and returning
+            a dataframe; defaults to default_engines
+        components (dict, optional): Salary component percentages
+        calendar (BusinessCalendar, optional): Calendar for proration
+        tolerance (float, optional): Largest accepted difference in naira
+        workers (int, optional): Worker processes for the reference and parallel engine
+
+    Returns:
+        dict: Engine name -> mismatches DataFrame (empty when equivalent)
+    """
+    df = df.reset_index(drop=True)
+    engines = engines or default_engines(components, calendar, workers)
+    reference = reference_results(SalaryCalculator(components, calendar), df, workers)
+
+    report = {}
+    for name, engine in engines.items():
+        candidate = engine(df)
+        if list(candidate.columns) != OUTPUT_COLUMNS or len(candidate) != len(df):
+            raise ValueError(f"Engine {name} did not return one row of OUTPUT_COLUMNS per employee")
+        report[name] = find_mismatches(reference, candidate, tolerance)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check optimized calculators against the reference path")
+    parser.add_argument('--rows', type=int, default=100000, help="Random employees to generate")
+    parser.add_argument('--realistic-rows', type=int, default=100000, help="Realistic employees to generate")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--tolerance', type=float, default=0.0, help="Accepted difference in naira")
+    parser.add_argument('--workers', type=int, help="Worker processes")
+    args = parser.parse_args()
+
+    df = pd.concat([
+        edge_case_workforce(),
+        random_workforce(args.rows, args.seed),
+        generate_workforce(args.realistic_rows, args.seed)
+    ], ignore_index=True)
+    report = check_equivalence(df, tolerance=args.tolerance, workers=args.workers)
+
+    failed = False
+    for name, mismatches in report.items():
+        if mismatches.empty:
+            print(f"{name}: {len(df):,} employees match")
+            continue
+        failed = True
+        print(f"{name}: {len(mismatches):,} mismatches in {mismatches['row'].nunique():,} employees")
+        print(mismatches.groupby('column')['difference'].agg(['count', 'min', 'max']).to_string())
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
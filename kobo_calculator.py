@@ -0,0 +1,196 @@
+"""
+Fixed-point salary calculation in integer kobo
+"""
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from salary_calculator import SalaryCalculator, SalaryResult, IDENTITY_COLUMNS, OUTPUT_COLUMNS, STAGE_TIMINGS
+
+KOBO_PER_NAIRA = 100
+
+# Percentages are carried in basis points (1% = 100)
+BASIS_POINTS = 10000
+
+# Working-day ratios are carried in hundredths, matching the 2 dp float ratio
+RATIO_SCALE = 100
+
+
+def divide_round_half_up(numerator, denominator):
+    """Integer division rounding halves away from zero, for int64 arrays."""
+    numerator = np.asarray(numerator, dtype=np.int64)
+    quotient = (np.abs(numerator) * 2 + denominator) // (2 * denominator)
+    return np.where(numerator < 0, -quotient, quotient)
+
+
+def naira_to_kobo(amounts):
+    """Convert naira amounts to int64 kobo, rounding half away from zero."""
+    amounts = np.asarray(amounts, dtype=float)
+    return (np.sign(amounts) * np.floor(np.abs(amounts) * KOBO_PER_NAIRA + 0.5)).astype(np.int64)
+
+
+def kobo_to_naira(amounts):
+    """Convert int64 kobo back to float naira for output."""
+    return np.asarray(amounts, dtype=np.int64) / KOBO_PER_NAIRA
+
+
+def to_basis_points(rates):
+    """Convert fractional rates, such as 0.08, to int64 basis points."""
+    return np.rint(np.asarray(rates, dtype=float) * BASIS_POINTS).astype(np.int64)
+
+
+class KoboSalaryCalculator(SalaryCalculator):
+    """
+    Salary calculator that runs the whole pipeline on int64 kobo.
+
+    Every amount is an exact integer number of kobo, so column totals
+    reconcile exactly with bank files. Each step rounds once, half away from
+    zero, where the float calculator rounds half to even on binary values, so
+    the two can differ by a kobo on exact half-kobo intermediate amounts.
+    """
+
+    def calculate_working_days_ratios(self, start_dates, end_dates):
+        """Business-day ratios rounded half up to hundredths."""
+        worked = self.calendar.business_days_between(start_dates, end_dates)
+        total = self.calendar.month_business_days(end_dates)
+        return divide_round_half_up(worked * RATIO_SCALE, total) / RATIO_SCALE
+
+    def calculate_columns(self, annual_gross, working_ratio, is_contract,
+                          voluntary_pension, reimbursements, other_deductions, rules=None):
+        """Calculate every output amount in kobo and convert to naira for output."""
+        columns = self.calculate_columns_kobo(
+            naira_to_kobo(annual_gross),
+            np.rint(np.asarray(working_ratio) * RATIO_SCALE).astype(np.int64),
+            is_contract,
+            naira_to_kobo(voluntary_pension),
+            naira_to_kobo(reimbursements),
+            naira_to_kobo(other_deductions),
+            rules
+        )
+        result = {name: kobo_to_naira(values) for name, values in columns.items()}
+        result['WORKING_DAYS_RATIO'] = columns['WORKING_DAYS_RATIO'] / RATIO_SCALE
+        return result
+
+    def calculate_columns_kobo(self, annual_gross, ratio_hundredths, is_contract,
+                               voluntary_pension, reimbursements, other_deductions, rules=None):
+        """
+        Calculate every output amount as int64 kobo.
+
+        Args:
+            annual_gross (np.ndarray): Annual gross pay in kobo
+            ratio_hundredths (np.ndarray): Working-days ratio in hundredths
+            is_contract (np.ndarray): True for CONTRACT staff
+            voluntary_pension, reimbursements, other_deductions (np.ndarray): Kobo
+            rules (StatutoryRules, optional): Rule version, the current rules by default
+
+        Returns:
+            dict: Output columns in kobo (the ratio stays in hundredths)
+        """
+        rules = rules or self.rules
+        timings = STAGE_TIMINGS if STAGE_TIMINGS.enabled else None
+        if timings:
+            started = perf_counter()
+            rows = np.size(annual_gross)
+
+        monthly_gross = divide_round_half_up(annual_gross, 12)
+        prorated_monthly_gross = divide_round_half_up(monthly_gross * ratio_hundredths, RATIO_SCALE)
+        if timings:
+            started = timings.record('proration', started, rows)
+
+        # Prorated components from basis-point percentages, rounded once
+        components = {
+            component: divide_round_half_up(
+                monthly_gross * to_basis_points(np.asarray(percentage) / 100) * ratio_hundredths,
+                BASIS_POINTS * RATIO_SCALE
+            )
+            for component, percentage in self.components.items()
+        }
+        zeros = np.zeros_like(monthly_gross)
+        if timings:
+            started = timings.record('components', started, rows)
+
+        # Pension contributions
+        no_pension = is_contract | (prorated_monthly_gross < naira_to_kobo(rules.pension_threshold))
+        pensionable_base = components['BASIC'] + components['TRANSPORT'] + components['HOUSING']
+        employee_pension = np.where(no_pension, 0, divide_round_half_up(
+            pensionable_base * to_basis_points(rules.employee_pension_rate), BASIS_POINTS))
+        employer_pension = np.where(no_pension, 0, divide_round_half_up(
+            pensionable_base * to_basis_points(rules.employer_pension_rate), BASIS_POINTS))
+        voluntary = np.where(no_pension, 0, voluntary_pension)
+        if timings:
+            started = timings.record('pension', started, rows)
+
+        # CRA on gross after statutory deductions
+        adjusted_gross = prorated_monthly_gross - (employee_pension + voluntary)
+        cra_percentage = divide_round_half_up(adjusted_gross * to_basis_points(rules.cra_percent_rate), BASIS_POINTS)
+        minimum_relief = np.maximum(
+            divide_round_half_up(adjusted_gross * to_basis_points(rules.cra_minimum_rate), BASIS_POINTS),
+            divide_round_half_up(naira_to_kobo(rules.cra_annual_floor), 12)
+        )
+        cra = cra_percentage + minimum_relief
+        if timings:
+            started = timings.record('cra', started, rows)
+
+        taxable_pay = adjusted_gross - cra
+        paye_tax = self.calculate_paye_kobo(taxable_pay, rules)
+        if timings:
+            started = timings.record('paye', started, rows)
+
+        total_deductions = paye_tax + employee_pension + voluntary + other_deductions
+        net_pay = prorated_monthly_gross - total_deductions + reimbursements
+        total_tax_relief = cra + employee_pension + voluntary
+        if timings:
+            timings.record('net_pay', started, rows)
+
+        return {
+            'MONTHLY_GROSS': monthly_gross,
+            'WORKING_DAYS_RATIO': ratio_hundredths,
+            'PRORATED_MONTHLY_GROSS': prorated_monthly_gross,
+            'COMP_BASIC': components['BASIC'],
+            'COMP_TRANSPORT': components['TRANSPORT'],
+            'COMP_HOUSING': components['HOUSING'],
+            'COMP_UTILITY': components['UTILITY'],
+            'COMP_MEAL': components.get('MEAL', zeros),
+            'COMP_CLOTHING': components.get('CLOTHING', zeros),
+            'CRA': cra,
+            'MANDATORY_PENSION': employee_pension,
+            'VOLUNTARY_PENSION': voluntary,
+            'EMPLOYER_PENSION': employer_pension,
+            'TAX_RELIEF': total_tax_relief,
+            'TAXABLE_PAY': taxable_pay,
+            'PAYE_TAX': paye_tax,
+            'OTHER_DEDUCTIONS': other_deductions,
+            'REIMBURSEMENTS': reimbursements,
+            'TOTAL_DEDUCTIONS': total_deductions,
+            'NET_PAY': net_pay
+        }
+
+    def calculate_paye_kobo(self, taxable_pay, rules=None):
+        """Monthly PAYE in kobo for monthly taxable pay in kobo, rounded once."""
+        thresholds, rates, cumulative_tax = (rules or self.rules).tax_table.kobo_schedule()
+        annual_taxable = np.maximum(taxable_pay * 12, 0)
+        band = np.searchsorted(thresholds, annual_taxable, side='right') - 1
+
+        # Annual tax scaled by BASIS_POINTS stays an exact integer
+        scaled_tax = cumulative_tax[band] + (annual_taxable - thresholds[band]) * rates[band]
+        return divide_round_half_up(scaled_tax, BASIS_POINTS * 12)
+
+    def calculate_employee(self, row):
+        """Calculate a single employee through the kobo pipeline, as one-element arrays."""
+        ratio = self.calculate_working_days_ratios(row['START DATE'], row['END DATE'])
+        columns = self.calculate_columns_kobo(
+            naira_to_kobo([float(row['ANNUAL GROSS PAY'])]),
+            np.rint(ratio * RATIO_SCALE).astype(np.int64),
+            self._contract_mask(pd.Series([row['Contract Type']])),
+            naira_to_kobo([float(row.get('VOLUNTARY_PENSION', 0))]),
+            naira_to_kobo([float(row.get('Reimbursements', 0))]),
+            naira_to_kobo([float(row.get('Other Deductions', 0))]),
+            self.rule_book.for_date(row['END DATE'])
+        )
+        amounts = {name: float(kobo_to_naira(values)[0]) for name, values in columns.items()}
+        amounts['WORKING_DAYS_RATIO'] = float(columns['WORKING_DAYS_RATIO'][0] / RATIO_SCALE)
+        return SalaryResult(*(
+            row[column] if column in IDENTITY_COLUMNS else amounts[column]
+            for column in OUTPUT_COLUMNS
+        ))
@@ -4,10 +4,24 @@ from datetime import datetime, date
 from calendar import monthrange
 from database import init_db, add_employee, get_all_employees, generate_staff_id, create_payroll_period
 from database import get_active_payroll_period, create_payroll_run, save_payroll_details, update_payroll_run_status
-from salary_calculator import SalaryCalculator
+from database import get_statutory_rules, save_off_cycle_run, save_payroll_run, get_payroll_period_for_date
+from database import get_payroll_history, save_payroll_arrears, get_pending_arrears, get_payroll_ytd
+from database import get_payroll_trace
+from salary_calculator import SalaryCalculator, DEFAULT_COMPONENTS
+from kobo_calculator import KoboSalaryCalculator
+from business_calendar import nigeria_calendar
+from bulk_processing import stream_calculate_file
+from columnar_io import arrow_available, detect_format, parquet_bytes, read_employees, PARQUET
+from calculation_cache import shared_cache
+from calculation_trace import CalculationTrace, rules_to_dict
+from tax_rules import rule_book_from_records
+from off_cycle import calculate_off_cycle, PAYMENT_TYPES
+from arrears import HISTORY_COLUMNS, period_arrears, arrears_totals, arrears_frame, apply_arrears, apply_arrears_ytd
+from ytd_paye import apply_ytd_paye, opening_totals_known, ytd_frame
 from utils import validate_percentages, generate_csv_template, validate_csv, process_bulk_upload
 from payslip_generator import PayslipGenerator
 import os
+import tempfile
 from pages.employee_management import render_page as render_employee_management
 from pages.employee_details import render_page as render_employee_details
 from pages.admin_tools import render_page as render_admin_tools
@@ -153,6 +167,10 @@ def salary_calculator_page():
         st.session_state.calculated_results = None
     if 'single_calculation_result' not in st.session_state:
         st.session_state.single_calculation_result = None
+    if 'streamed_results' not in st.session_state:
+        st.session_state.streamed_results = None
+    if 'gross_up_result' not in st.session_state:
+        st.session_state.gross_up_result = None
 
     # Sidebar for component configuration with better styling
     st.sidebar.markdown('<div class="sidebar-section-header">CONFIGURATION</div>', unsafe_allow_html=True)
@@ -162,12 +180,12 @@ def salary_calculator_page():
     st.sidebar.markdown('<p class="text-helper">Adjust how the salary is split between different components. These percentages affect tax and pension calculations.</p>', unsafe_allow_html=True)
 
     components = {
-        "BASIC": st.sidebar.number_input("Basic Salary", min_value=0.0, max_value=100.0, value=30.0, step=0.1),
-        "TRANSPORT": st.sidebar.number_input("Transport", min_value=0.0, max_value=100.0, value=25.0, step=0.1),
-        "HOUSING": st.sidebar.number_input("Housing", min_value=0.0, max_value=100.0, value=20.0, step=0.1),
-        "UTILITY": st.sidebar.number_input("Other Benefits", min_value=0.0, max_value=100.0, value=15.0, step=0.1),
-        "MEAL": st.sidebar.number_input("Meal Allowance", min_value=0.0, max_value=100.0, value=5.0, step=0.1),
-        "CLOTHING": st.sidebar.number_input("Clothing Allowance", min_value=0.0, max_value=100.0, value=5.0, step=0.1)
+        "BASIC": st.sidebar.number_input("Basic Salary", min_value=0.0, max_value=100.0, value=DEFAULT_COMPONENTS["BASIC"], step=0.1),
+        "TRANSPORT": st.sidebar.number_input("Transport", min_value=0.0, max_value=100.0, value=DEFAULT_COMPONENTS["TRANSPORT"], step=0.1),
+        "HOUSING": st.sidebar.number_input("Housing", min_value=0.0, max_value=100.0, value=DEFAULT_COMPONENTS["HOUSING"], step=0.1),
+        "UTILITY": st.sidebar.number_input("Other Benefits", min_value=0.0, max_value=100.0, value=DEFAULT_COMPONENTS["UTILITY"], step=0.1),
+        "MEAL": st.sidebar.number_input("Meal Allowance", min_value=0.0, max_value=100.0, value=DEFAULT_COMPONENTS["MEAL"], step=0.1),
+        "CLOTHING": st.sidebar.number_input("Clothing Allowance", min_value=0.0, max_value=100.0, value=DEFAULT_COMPONENTS["CLOTHING"], step=0.1)
     }
 
     # Validate percentages
@@ -179,8 +197,27 @@ def salary_calculator_page():
         st.sidebar.error("Total percentage must equal 100%")
         return
 
+    # Optional public-holiday calendar for proration
+    exclude_holidays = st.sidebar.checkbox(
+        "Exclude Nigerian public holidays",
+        value=False,
+        help="Prorate using business days that skip federal public holidays"
+    )
+    this_year = date.today().year
+    calendar = nigeria_calendar(range(this_year - 5, this_year + 2)) if exclude_holidays else None
+
+    exact_kobo = st.sidebar.checkbox(
+        "Exact kobo arithmetic",
+        value=False,
+        help="Calculate in whole kobo so totals reconcile exactly with bank files"
+    )
+    calculator_class = KoboSalaryCalculator if exact_kobo else SalaryCalculator
+
+    # Effective-dated statutory rules, compiled once per page run
+    rule_book = rule_book_from_records(get_statutory_rules())
+
     # Create tabs for different calculation methods
-    tab1, tab2 = st.tabs(["One Employee", "Multiple Employees"])
+    tab1, tab2, tab3 = st.tabs(["One Employee", "Multiple Employees", "Net to Gross"])
 
     with tab1:
         # Add welcome message
@@ -231,7 +268,7 @@ def salary_calculator_page():
                     'VOLUNTARY_PENSION': voluntary_pension
                 }])
 
-                calculator = SalaryCalculator(components)
+                calculator = calculator_class(components, calendar, rule_book=rule_book)
                 result = calculator.process_dataframe(single_employee_data)
                 st.session_state.single_calculation_result = result
 
@@ -254,7 +291,9 @@ def salary_calculator_page():
                 st.metric("Net Pay", f"₦{result['NET_PAY']:,.2f}")
 
             # Create tabs for detailed breakdown
-            details_tab1, details_tab2, details_tab3 = st.tabs(["Components", "Deductions", "Tax"])
+            details_tab1, details_tab2, details_tab3, details_tab4 = st.tabs(
+                ["Components", "Deductions", "Tax", "How It Was Worked Out"]
+            )
 
             with details_tab1:
                 st.subheader("Salary Components")
@@ -297,6 +336,18 @@ def salary_calculator_page():
                 }
                 st.dataframe(pd.DataFrame(tax_data))
 
+            with details_tab4:
+                st.subheader("Step-by-Step Calculation")
+                trace = calculator_class(components, calendar, rule_book=rule_book).trace_result(result)
+                st.dataframe(trace.to_dataframe(), hide_index=True)
+                st.caption(f"Statutory rules effective from {trace.rules.effective_from}")
+                st.download_button(
+                    label="Download Calculation Trace",
+                    data=trace.to_json(),
+                    file_name="calculation_trace.json",
+                    mime="application/json"
+                )
+
             # Additional info
             st.write("Note: Employer contribution to pension: ", f"₦{result['EMPLOYER_PENSION']:,.2f}")
 
@@ -379,11 +430,44 @@ def salary_calculator_page():
         )
 
         # File uploader
-        uploaded_file = st.file_uploader("Select Your File", type=["csv"])
+        uploaded_file = st.file_uploader("Select Your File", type=["csv", "parquet", "arrow", "feather"])
+        large_file_mode = st.checkbox(
+            "Large file mode",
+            help="Calculate in chunks and save results straight to a file instead of showing them on screen"
+        )
 
-        if uploaded_file is not None:
+        if uploaded_file is not None and large_file_mode:
             try:
-                df = pd.read_csv(uploaded_file)
+                input_format = detect_format(uploaded_file.name)
+                if input_format == 'csv':
+                    # Preview only the first rows; the full file is never loaded at once
+                    st.subheader("Data Preview")
+                    st.dataframe(pd.read_csv(uploaded_file, nrows=5))
+                    uploaded_file.seek(0)
+
+                output_suffix = ".csv"
+                if arrow_available():
+                    output_format = st.radio("Results format", ["CSV", "Parquet"], horizontal=True)
+                    output_suffix = ".parquet" if output_format == "Parquet" else ".csv"
+
+                if st.button("Calculate All Salaries", key="stream_calculate_all"):
+                    calculator = calculator_class(components, calendar, rule_book=rule_book)
+                    # The directory is removed when the results are replaced or reset, or when
+                    # an abandoned session's state is garbage collected
+                    results_dir = tempfile.TemporaryDirectory(prefix="salary_results_")
+                    output_path = os.path.join(results_dir.name, "salary_results" + output_suffix)
+                    with st.spinner("Calculating salaries in chunks..."):
+                        summary = stream_calculate_file(calculator, uploaded_file, output_path, input_format=input_format)
+                    if st.session_state.streamed_results is not None:
+                        st.session_state.streamed_results['directory'].cleanup()
+                    st.session_state.streamed_results = dict(summary, path=output_path, directory=results_dir)
+
+            except Exception as e:
+                st.error(f"Error processing file: {str(e)}")
+
+        elif uploaded_file is not None:
+            try:
+                df = read_employees(uploaded_file, detect_format(uploaded_file.name))
                 st.session_state.uploaded_data = df
 
                 # Show preview of uploaded data
@@ -392,13 +476,37 @@ def salary_calculator_page():
 
                 # Button to process data
                 if st.button("Calculate All Salaries"):
-                    calculator = SalaryCalculator(components)
+                    calculator = calculator_class(components, calendar, rule_book=rule_book)
                     results = calculator.process_dataframe(df)
                     st.session_state.calculated_results = results
 
             except Exception as e:
                 st.error(f"Error processing file: {str(e)}")
 
+        # Display streamed calculation summary
+        if st.session_state.streamed_results is not None:
+            summary = st.session_state.streamed_results
+            st.subheader("Your Salary Results")
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Employees", f"{summary['rows']:,}")
+            col2.metric("Total PAYE", f"₦{summary['total_paye']:,.2f}")
+            col3.metric("Total Net Pay", f"₦{summary['total_net_pay']:,.2f}")
+
+            is_parquet = detect_format(summary['path']) == PARQUET
+            with open(summary['path'], "rb") as results_file:
+                st.download_button(
+                    label="Save Results",
+                    data=results_file,
+                    file_name="salary_results.parquet" if is_parquet else "salary_results.csv",
+                    mime="application/vnd.apache.parquet" if is_parquet else "text/csv",
+                    key="save_streamed_results"
+                )
+
+            if st.button("Start a New Calculation", key="reset_streamed_results"):
+                summary['directory'].cleanup()
+                st.session_state.streamed_results = None
+                st.rerun()
+
         # Display bulk calculation results
         if st.session_state.calculated_results is not None:
             st.subheader("Your Salary Breakdown")
@@ -476,6 +584,13 @@ def salary_calculator_page():
                 file_name="salary_results.csv",
                 mime="text/csv"
             )
+            if arrow_available():
+                st.download_button(
+                    label="Save Results (Parquet)",
+                    data=parquet_bytes(st.session_state.calculated_results),
+                    file_name="salary_results.parquet",
+                    mime="application/vnd.apache.parquet"
+                )
 
             # Button to calculate again
             if st.button("Start a New Calculation"):
@@ -483,6 +598,63 @@ def salary_calculator_page():
                 st.session_state.calculated_results = None
                 st.rerun()
 
+    with tab3:
+        st.write("Know the monthly take-home pay you want to offer? Find the yearly salary that delivers it.")
+
+        st.subheader("Find the Yearly Salary for a Net Pay")
+
+        with st.form("net_to_gross_form"):
+            col1, col2 = st.columns(2)
+
+            with col1:
+                target_net = st.number_input("Monthly Take-Home Pay (₦)", min_value=0.0, value=0.0, key="gross_up_target")
+                gross_up_contract = st.selectbox("Employment Type", ["Full Time", "Contract"], key="gross_up_contract")
+
+            with col2:
+                gross_up_vol_pension = st.number_input("Extra Pension Contribution (₦)", min_value=0.0, value=0.0,
+                                                          key="gross_up_vol_pension")
+
+            gross_up_submitted = st.form_submit_button("Find Yearly Salary")
+
+            if gross_up_submitted and target_net <= 0:
+                st.error("Enter a monthly take-home pay above zero.")
+            elif gross_up_submitted:
+                calculator = calculator_class(components, calendar, rule_book=rule_book)
+                offer = pd.DataFrame([{
+                    'TARGET NET PAY': target_net,
+                    'Contract Type': gross_up_contract,
+                    'VOLUNTARY_PENSION': gross_up_vol_pension
+                }])
+                st.session_state.gross_up_result = calculator.gross_up_dataframe(offer).iloc[0]
+
+        if st.session_state.gross_up_result is not None:
+            result = st.session_state.gross_up_result
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Yearly Salary", f"₦{result['ANNUAL GROSS PAY']:,.2f}")
+            col2.metric("Monthly Gross", f"₦{result['MONTHLY_GROSS']:,.2f}")
+            col3.metric("Net Pay", f"₦{result['NET_PAY']:,.2f}")
+
+        st.subheader("Solve Many Offers at Once")
+        st.write("Upload a CSV with a 'TARGET NET PAY' column. 'Contract Type' and 'VOLUNTARY_PENSION' columns are optional.")
+
+        offers_file = st.file_uploader("Select Your Offers File", type=["csv"], key="gross_up_file")
+        if offers_file is not None:
+            try:
+                offers = pd.read_csv(offers_file)
+                if st.button("Find All Yearly Salaries"):
+                    calculator = calculator_class(components, calendar, rule_book=rule_book)
+                    solved = calculator.gross_up_dataframe(offers)
+                    st.dataframe(solved)
+                    st.download_button(
+                        label="Save Results",
+                        data=solved.to_csv(index=False).encode('utf-8'),
+                        file_name="net_to_gross_results.csv",
+                        mime="text/csv",
+                        key="save_gross_up_results"
+                    )
+            except Exception as e:
+                st.error(f"Error processing file: {str(e)}")
+
     # Instructions
     with st.expander("Quick Guide"):
         st.markdown("""
@@ -500,6 +672,14 @@ def salary_calculator_page():
         6. Tap "Calculate All Salaries" to process everything
         7. Download your complete results
 
+        ### How to Work Out a Salary from Take-Home Pay:
+        1. Open the "Net to Gross" tab
+        2. Enter the monthly take-home pay, employment type and any extra pension
+        3. Tap "Find Yearly Salary", or upload a CSV of offers to solve them all at once
+
+        For very large files, tick "Large file mode" to calculate in chunks and download the results without showing them on screen.
+        Parquet and Arrow files from your HR system can be uploaded in place of CSV, and results can be saved as Parquet.
+
         **Information You'll Need:**
         - Account Number (for payroll reference)
         - Staff ID (employee identifier)
@@ -528,6 +708,53 @@ def salary_calculator_page():
         """)
 
 
+# Payroll table column -> calculator output column
+PAYROLL_RECORD_COLUMNS = {
+    'Employee': 'NAME',
+    'Staff ID': 'STAFF ID',
+    'Department': 'DEPARTMENT',
+    'Annual Salary': 'ANNUAL GROSS PAY',
+    'Basic': 'COMP_BASIC',
+    'Housing': 'COMP_HOUSING',
+    'Transport': 'COMP_TRANSPORT',
+    'Utility': 'COMP_UTILITY',
+    'Meal': 'COMP_MEAL',
+    'Clothing': 'COMP_CLOTHING',
+    'Gross Pay': 'PRORATED_MONTHLY_GROSS',
+    'Pension': 'MANDATORY_PENSION',
+    'Additional Pension': 'VOLUNTARY_PENSION',
+    'PAYE': 'PAYE_TAX',
+    'Other Deductions': 'OTHER_DEDUCTIONS',
+    'Reimbursements': 'REIMBURSEMENTS',
+    'Arrears': 'ARREARS_GROSS_PAY',
+    'Net Pay': 'NET_PAY',
+}
+
+def payroll_month(period_name):
+    """First day of the month named by a payroll period such as 'October 2026', or None"""
+    try:
+        return datetime.strptime(period_name.strip(), '%B %Y').date()
+    except ValueError:
+        return None
+
+def employees_already_paid(user_id, employee_ids, month_start):
+    """Employees with a saved regular run, or year-to-date totals, for a payroll month or a later one"""
+    since = month_start.strftime('%Y-%m-%d')
+    paid = {row['employee_id'] for row in get_payroll_history(user_id, employee_ids, since)}
+    paid.update(employee_id for employee_id, record in get_payroll_ytd(employee_ids, month_start.year).items()
+                if (record['last_period_end'] or '') >= since)
+    return paid
+
+def get_payroll_period(user_id, day):
+    """Payroll period covering ``day``, creating one for its month if there is none"""
+    period = get_payroll_period_for_date(user_id, day.strftime('%Y-%m-%d'))
+    if not period:
+        month_end = day.replace(day=monthrange(day.year, day.month)[1])
+        create_payroll_period(user_id, day.strftime('%B %Y'),
+                              day.replace(day=1).strftime('%Y-%m-%d'), month_end.strftime('%Y-%m-%d'))
+        period = get_payroll_period_for_date(user_id, day.strftime('%Y-%m-%d'))
+    return period
+
 def payroll_processing_page():
     # Get user ID from session state
     user_id = st.session_state.user_id
@@ -541,15 +768,25 @@ def payroll_processing_page():
     # Initialize session state
     if 'payroll_data' not in st.session_state:
         st.session_state.payroll_data = None
+    if 'payroll_results' not in st.session_state:
+        st.session_state.payroll_results = None
     if 'total_payroll' not in st.session_state:
         st.session_state.total_payroll = 0
     if 'review_data' not in st.session_state:
         st.session_state.review_data = None
+    if 'payroll_month' not in st.session_state:
+        st.session_state.payroll_month = None
+    if 'payroll_ytd' not in st.session_state:
+        st.session_state.payroll_ytd = None
+    if 'payroll_rules' not in st.session_state:
+        st.session_state.payroll_rules = None
+    if 'payroll_run_id' not in st.session_state:
+        st.session_state.payroll_run_id = None
     if 'period_name' not in st.session_state:
         today = date.today()
         st.session_state.period_name = today.strftime('%B %Y')
 
-    tab1, tab2 = st.tabs(["Process Payroll", "Export Options"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Process Payroll", "Export Options", "Off-Cycle Payments", "Back Pay"])
 
     with tab1:
         st.subheader("Payroll Calculator")
@@ -630,74 +867,96 @@ def payroll_processing_page():
 
                 with col1:
                     if st.button("Calculate Payroll"):
-                        def process_reviewed_data(edited_df, employees):
-                            calculator = SalaryCalculator({
-                                "BASIC": 30.0,
-                                "TRANSPORT": 25.0,
-                                "HOUSING": 20.0,
-                                "UTILITY": 15.0,
-                                "MEAL": 5.0,
-                                "CLOTHING": 5.0
+                        def process_reviewed_data(edited_df, employees, month_start):
+                            month_end = month_start.replace(day=monthrange(month_start.year, month_start.month)[1])
+                            calculator = SalaryCalculator(DEFAULT_COMPONENTS, cache=shared_cache(),
+                                                          rule_book=rule_book_from_records(get_statutory_rules()))
+
+                            # The editor keeps the review rows in order, so ids line up by position
+                            employee_ids = st.session_state.review_data['_employee_id'].to_numpy()
+                            by_id = {employee['id']: employee for employee in employees}
+                            selected = [by_id[employee_id] for employee_id in employee_ids]
+
+                            # Pay each employee for the part of the period they were employed
+                            start_dates = pd.Series(pd.to_datetime([employee['start_date'] for employee in selected]))
+                            end_dates = pd.Series(pd.to_datetime([employee['end_date'] or month_end for employee in selected]))
+
+                            employees_df = pd.DataFrame({
+                                'Account Number': [employee['account_number'] for employee in selected],
+                                'STAFF ID': edited_df['Staff ID'].to_numpy(),
+                                'Email': [employee['email'] for employee in selected],
+                                'NAME': edited_df['Employee'].to_numpy(),
+                                'DEPARTMENT': edited_df['Department'].to_numpy(),
+                                'JOB TITLE': [employee['job_title'] for employee in selected],
+                                'ANNUAL GROSS PAY': edited_df['Annual Gross Pay'].to_numpy(dtype=float),
+                                'Contract Type': edited_df['Contract Type'].to_numpy(),
+                                'START DATE': start_dates.clip(lower=pd.Timestamp(month_start)).dt.strftime('%Y-%m-%d').to_numpy(),
+                                'END DATE': end_dates.clip(upper=pd.Timestamp(month_end)).dt.strftime('%Y-%m-%d').to_numpy(),
+                                'Reimbursements': edited_df['Reimbursements'].to_numpy(),
+                                'Other Deductions': edited_df['Other Deductions'].to_numpy(),
+                                'VOLUNTARY_PENSION': edited_df['Voluntary Pension'].to_numpy()
                             })
 
-                            payroll_records = []
-                            total_payroll = 0
-
-                            for _, row in edited_df.iterrows():
-                                employee_id = st.session_state.review_data.loc[
-                                    st.session_state.review_data['Employee'] == row['Employee'],
-                                    '_employee_id'
-                                ].iloc[0]
-
-                                employee = next(emp for emp in employees if emp['id'] == employee_id)
-
-                                emp_df = pd.DataFrame([{
-                                    'Account Number': employee['account_number'],
-                                    'STAFF ID': row['Staff ID'],
-                                    'Email': employee['email'],
-                                    'NAME': row['Employee'],
-                                    'DEPARTMENT': row['Department'],
-                                    'JOB TITLE': employee['job_title'],
-                                    'ANNUAL GROSS PAY': row['Annual Gross Pay'],
-                                    'Contract Type': row['Contract Type'],
-                                    'START DATE': employee['start_date'],
-                                    'END DATE': employee['end_date'] or datetime.now().strftime('%Y-%m-%d'),
-                                    'Reimbursements': row['Reimbursements'],
-                                    'Other Deductions': row['Other Deductions'],
-                                    'VOLUNTARY_PENSION': row['Voluntary Pension']
-                                }])
-
-                                result = calculator.process_dataframe(emp_df).iloc[0]
-
-                                record = {
-                                    'Employee': row['Employee'],
-                                    'Staff ID': row['Staff ID'],
-                                    'Department': row['Department'],
-                                    'Annual Salary': row['Annual Gross Pay'],
-                                    'Basic': result['COMP_BASIC'],
-                                    'Housing': result['COMP_HOUSING'],
-                                    'Transport': result['COMP_TRANSPORT'],
-                                    'Utility': result['COMP_UTILITY'],
-                                    'Meal': result['COMP_MEAL'],
-                                    'Clothing': result['COMP_CLOTHING'],
-                                    'Gross Pay': result['PRORATED_MONTHLY_GROSS'],
-                                    'Pension': result['MANDATORY_PENSION'],
-                                    'Additional Pension': result['VOLUNTARY_PENSION'],
-                                    'PAYE': result['PAYE_TAX'],
-                                    'Other Deductions': result['OTHER_DEDUCTIONS'],
-                                    'Reimbursements': result['REIMBURSEMENTS'],
-                                    'Net Pay': result['NET_PAY'],
-                                    '_employee_id': employee_id
-                                }
-
-                                payroll_records.append(record)
-                                total_payroll += record['Net Pay']
-
-                            st.session_state.payroll_data = pd.DataFrame(payroll_records)
-                            st.session_state.total_payroll = total_payroll
+                            # Employees already paid for this month or a later one are left out
+                            paid = employees_already_paid(user_id, employee_ids, month_start)
+                            if paid:
+                                keep = ~pd.Series(employee_ids).isin(paid).to_numpy()
+                                st.warning(f"Left out, already paid for {month_start.strftime('%B %Y')} or a later "
+                                           f"month: {', '.join(employees_df.loc[~keep, 'NAME'].astype(str))}")
+                                if not keep.any():
+                                    return
+                                employee_ids = employee_ids[keep]
+                                start_dates = start_dates[keep].reset_index(drop=True)
+                                employees_df = employees_df[keep].reset_index(drop=True)
+
+                            # PAYE runs on from the year-to-date totals of the months already saved
+                            stored_ytd = get_payroll_ytd(employee_ids, month_start.year)
+
+                            # Without opening totals an employee stays on annualised PAYE
+                            cumulative = opening_totals_known(employee_ids, stored_ytd, start_dates,
+                                                              month_start, month_start.month)
+                            if not cumulative.all():
+                                st.info(f"{int((~cumulative).sum())} employees have no year-to-date totals for "
+                                        f"{month_start.year} and are taxed on annualised PAYE until next year")
+
+                            # The whole run in one pass, with any pending arrears added
+                            results, ytd = apply_ytd_paye(
+                                calculator, calculator.process_dataframe(employees_df),
+                                ytd_frame(employee_ids, stored_ytd), month_start.month, month_end,
+                                cumulative=cumulative
+                            )
+                            pending_arrears = get_pending_arrears(user_id)
+                            arrears = arrears_frame([pending_arrears.get(employee_id) for employee_id in employee_ids])
+                            results = apply_arrears(results, arrears)
+                            ytd = apply_arrears_ytd(ytd, employee_ids, arrears)
+                            results.insert(0, 'employee_id', employee_ids)
+
+                            # Business days behind each ratio, saved so the run can be explained later
+                            results['DAYS_WORKED'] = calculator.calendar.business_days_between(
+                                employees_df['START DATE'], employees_df['END DATE'])
+                            results['DAYS_IN_MONTH'] = calculator.calendar.month_business_days(employees_df['END DATE'])
+
+                            payroll_data = pd.DataFrame({
+                                label: results[column].to_numpy() for label, column in PAYROLL_RECORD_COLUMNS.items()
+                            })
+                            payroll_data['_employee_id'] = employee_ids
+
+                            st.session_state.payroll_data = payroll_data
+                            st.session_state.payroll_results = results
+                            st.session_state.payroll_ytd = ytd
+                            st.session_state.payroll_rules = rules_to_dict(calculator.rule_book.for_date(month_end))
+                            st.session_state.payroll_run_id = None
+                            st.session_state.payroll_month = month_start
+                            st.session_state.period_name = month_start.strftime('%B %Y')
+                            st.session_state.total_payroll = float(results['NET_PAY'].sum())
                             st.session_state.review_data = None
                             st.rerun()
-                        process_reviewed_data(edited_df, employees)
+
+                        month_start = payroll_month(period_name)
+                        if month_start is None:
+                            st.error("Enter the payroll period as a month and year, e.g. October 2026")
+                        else:
+                            process_reviewed_data(edited_df, employees, month_start)
 
                 with col2:
                     if st.button("Save Changes"):
@@ -802,7 +1061,7 @@ def payroll_processing_page():
                 )
 
                 # Action buttons
-                col1, col2 = st.columns([1, 1])
+                col1, col2, col3 = st.columns([1, 1, 1])
 
                 with col1:
                     if st.button("Recalculate"):
@@ -812,8 +1071,67 @@ def payroll_processing_page():
                 with col2:
                     if st.button("Start Over"):
                         st.session_state.payroll_data = None
+                        st.session_state.payroll_results = None
                         st.session_state.total_payroll = 0
                         st.rerun()
+
+                with col3:
+                    if st.button("Save Payroll Run"):
+                        month_start = st.session_state.payroll_month
+                        period = get_payroll_period(user_id, month_start)
+                        results = st.session_state.payroll_results
+                        ytd = st.session_state.payroll_ytd
+
+                        # Employees paid since the run was calculated are not paid twice
+                        paid = employees_already_paid(user_id, results['employee_id'], month_start)
+                        unpaid = ~results['employee_id'].isin(paid)
+                        if not period:
+                            st.error("Could not find or create a payroll period for this run")
+                        elif not unpaid.any():
+                            st.error(f"Payroll for {month_start.strftime('%B %Y')} or a later month has already been saved")
+                        else:
+                            if paid:
+                                st.warning(f"Left out, already paid for {month_start.strftime('%B %Y')} or a later "
+                                           f"month: {', '.join(results.loc[~unpaid, 'NAME'].astype(str))}")
+                            success, result = save_payroll_run(user_id, period['id'], results[unpaid],
+                                                               ytd[~ytd.index.isin(paid)], month_start.year,
+                                                               st.session_state.payroll_rules, DEFAULT_COMPONENTS)
+                            if success:
+                                st.session_state.payroll_run_id = result
+                                st.success(f"Payroll run #{result} saved to {period['period_name']}")
+                            else:
+                                st.error(result)
+
+                # Traces are only built for the employee being looked at, from
+                # what was stored once the run is saved
+                with st.expander("How Pay Was Worked Out"):
+                    results = st.session_state.payroll_results
+                    position = st.selectbox(
+                        "Employee", range(len(results)),
+                        format_func=lambda i: f"{results['NAME'].iloc[i]} ({results['STAFF ID'].iloc[i]})",
+                        index=None,
+                        placeholder="Choose an employee",
+                        key="payroll_trace_employee"
+                    )
+                    if position is not None:
+                        run_id = st.session_state.payroll_run_id
+                        stored = get_payroll_trace(run_id, int(results['employee_id'].iloc[position])) if run_id else None
+                        if stored:
+                            trace = CalculationTrace.from_dict(stored)
+                        else:
+                            calculator = SalaryCalculator(DEFAULT_COMPONENTS,
+                                                          rule_book=rule_book_from_records(get_statutory_rules()))
+                            trace = calculator.trace_result(results.iloc[position])
+                        st.dataframe(trace.to_dataframe(), hide_index=True)
+                        st.caption(f"Statutory rules effective from {trace.rules.effective_from}"
+                                   + (f", as saved with payroll run #{run_id}" if stored else ""))
+                        st.download_button(
+                            label="Download Calculation Trace",
+                            data=trace.to_json(),
+                            file_name=f"calculation_trace_{results['STAFF ID'].iloc[position]}.json",
+                            mime="application/json",
+                            key="download_payroll_trace"
+                        )
             handle_payroll_calculation(employees)
 
     with tab2:
@@ -849,6 +1167,13 @@ def payroll_processing_page():
                 file_name=f"salary_results_{st.session_state.period_name.replace(' ', '_')}.csv",
                 mime="text/csv"
             )
+            if arrow_available():
+                st.download_button(
+                    label="Download Payroll Data (Parquet)",
+                    data=parquet_bytes(calculator_format_data.drop(['_employee_id'], axis=1)),
+                    file_name=f"salary_results_{st.session_state.period_name.replace(' ', '_')}.parquet",
+                    mime="application/vnd.apache.parquet"
+                )
 
             # Add option to generate payslips
             st.subheader("Generate Payslips")
@@ -914,6 +1239,154 @@ def payroll_processing_page():
         else:
             st.warning("No payroll data available. Please calculate payroll first.")
 
+    with tab3:
+        st.subheader("Bonus, Thirteenth Month and Arrears Payments")
+        st.write("One-off payments are taxed on the extra tax they add to each employee's regular yearly pay, "
+                 "and are saved as a separate payroll run.")
+
+        if 'off_cycle_results' not in st.session_state:
+            st.session_state.off_cycle_results = None
+
+        payment_date = st.date_input("Payment Date", value=date.today(), key="off_cycle_payment_date")
+        payments_df = st.data_editor(
+            pd.DataFrame([{
+                'Employee': employee['full_name'],
+                'Staff ID': employee['staff_id'],
+                'Payment Type': PAYMENT_TYPES[0],
+                'Amount': 0.0,
+                '_employee_id': employee['id']
+            } for employee in employees]),
+            hide_index=True,
+            use_container_width=True,
+            num_rows="fixed",
+            disabled=('Employee', 'Staff ID'),
+            column_order=('Employee', 'Staff ID', 'Payment Type', 'Amount'),
+            column_config={
+                'Payment Type': st.column_config.SelectboxColumn('Payment Type', options=PAYMENT_TYPES),
+                'Amount': st.column_config.NumberColumn(
+                    'Amount',
+                    help='One-off amount to pay (leave at 0 to skip the employee)',
+                    min_value=0,
+                    format="₦%d"
+                )
+            },
+            key="off_cycle_editor"
+        )
+
+        if st.button("Calculate Off-Cycle Payments"):
+            selected = payments_df[payments_df['Amount'] > 0]
+            if selected.empty:
+                st.warning("Enter an amount for at least one employee")
+            else:
+                by_id = {employee['id']: employee for employee in employees}
+                payments = pd.DataFrame({
+                    'employee_id': selected['_employee_id'].to_numpy(),
+                    'STAFF ID': selected['Staff ID'].to_numpy(),
+                    'NAME': selected['Employee'].to_numpy(),
+                    'ANNUAL GROSS PAY': [by_id[i]['annual_gross_pay'] for i in selected['_employee_id']],
+                    'Contract Type': [by_id[i]['contract_type'] for i in selected['_employee_id']],
+                    'VOLUNTARY_PENSION': [by_id[i].get('voluntary_pension') or 0 for i in selected['_employee_id']],
+                    'PAYMENT TYPE': selected['Payment Type'].to_numpy(),
+                    'ONE_OFF_AMOUNT': selected['Amount'].to_numpy(dtype=float)
+                })
+                calculator = SalaryCalculator(DEFAULT_COMPONENTS, rule_book=rule_book_from_records(get_statutory_rules()))
+                results = calculate_off_cycle(calculator, payments, payment_date)
+                results.insert(0, 'employee_id', payments['employee_id'].to_numpy())
+                st.session_state.off_cycle_results = results
+
+        results = st.session_state.off_cycle_results
+        if results is not None:
+            st.dataframe(results[['STAFF ID', 'NAME', 'PAYMENT TYPE', 'ONE_OFF_AMOUNT', 'PAYE_TAX', 'NET_PAYMENT']].rename(columns={
+                'STAFF ID': 'Staff ID', 'NAME': 'Employee', 'PAYMENT TYPE': 'Payment Type',
+                'ONE_OFF_AMOUNT': 'Amount', 'PAYE_TAX': 'PAYE', 'NET_PAYMENT': 'Net Payment'
+            }), hide_index=True, use_container_width=True)
+
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Total Paid", f"₦{results['ONE_OFF_AMOUNT'].sum():,.2f}")
+            col2.metric("Total PAYE", f"₦{results['PAYE_TAX'].sum():,.2f}")
+            col3.metric("Total Net", f"₦{results['NET_PAYMENT'].sum():,.2f}")
+
+            if st.button("Save Off-Cycle Run"):
+                period = get_payroll_period(user_id, payment_date)
+                if not period:
+                    st.error("Could not find or create a payroll period for this run")
+                else:
+                    success, result = save_off_cycle_run(user_id, period['id'], results)
+                    if success:
+                        st.success(f"Off-cycle run #{result} saved to {period['period_name']}")
+                        st.session_state.off_cycle_results = None
+                    else:
+                        st.error(result)
+
+    with tab4:
+        st.subheader("Backdated Pay Changes")
+        st.write("Enter the new yearly salary and the date it takes effect. Saved payroll periods since then "
+                 "are worked out again and the difference is added as arrears to the next payroll.")
+
+        if 'arrears_results' not in st.session_state:
+            st.session_state.arrears_results = None
+
+        changes_df = st.data_editor(
+            pd.DataFrame([{
+                'Employee': employee['full_name'],
+                'Staff ID': employee['staff_id'],
+                'Current Annual Gross': employee['annual_gross_pay'],
+                'New Annual Gross': employee['annual_gross_pay'],
+                'Effective Date': date.today().replace(day=1),
+                '_employee_id': employee['id']
+            } for employee in employees]),
+            hide_index=True,
+            use_container_width=True,
+            num_rows="fixed",
+            disabled=('Employee', 'Staff ID', 'Current Annual Gross'),
+            column_order=('Employee', 'Staff ID', 'Current Annual Gross', 'New Annual Gross', 'Effective Date'),
+            column_config={
+                'Current Annual Gross': st.column_config.NumberColumn('Current Annual Gross', format="₦%d"),
+                'New Annual Gross': st.column_config.NumberColumn('New Annual Gross', min_value=0, format="₦%d"),
+                'Effective Date': st.column_config.DateColumn('Effective Date')
+            },
+            key="arrears_editor"
+        )
+
+        if st.button("Calculate Arrears"):
+            changed = changes_df[changes_df['New Annual Gross'] != changes_df['Current Annual Gross']]
+            if changed.empty:
+                st.warning("Change the yearly salary of at least one employee")
+            else:
+                changes = pd.DataFrame({
+                    'employee_id': changed['_employee_id'].to_numpy(),
+                    'effective_date': pd.to_datetime(changed['Effective Date']).dt.strftime('%Y-%m-%d').to_numpy(),
+                    'new_annual_gross': changed['New Annual Gross'].to_numpy(dtype=float)
+                })
+                history = pd.DataFrame(get_payroll_history(
+                    user_id, changes['employee_id'], changes['effective_date'].min()
+                ), columns=HISTORY_COLUMNS)
+                calculator = SalaryCalculator(DEFAULT_COMPONENTS, rule_book=rule_book_from_records(get_statutory_rules()))
+                st.session_state.arrears_periods = period_arrears(calculator, history, changes)
+                st.session_state.arrears_results = arrears_totals(changes, st.session_state.arrears_periods)
+
+        arrears = st.session_state.arrears_results
+        if arrears is not None:
+            names = {employee['id']: employee['full_name'] for employee in employees}
+            st.dataframe(pd.DataFrame({
+                'Employee': [names.get(employee_id) for employee_id in arrears.index],
+                'Effective Date': arrears['effective_date'].to_numpy(),
+                'New Annual Gross': arrears['new_annual_gross'].to_numpy(),
+                'Periods': arrears['periods'].to_numpy(),
+                'Gross Arrears': arrears['gross_pay'].to_numpy(),
+                'Pension': arrears['pension_employee'].to_numpy(),
+                'PAYE': arrears['paye_tax'].to_numpy(),
+                'Net Arrears': arrears['net_pay'].to_numpy()
+            }), hide_index=True, use_container_width=True)
+
+            if st.button("Apply Pay Changes"):
+                success, message = save_payroll_arrears(user_id, arrears, st.session_state.arrears_periods)
+                if success:
+                    st.success(message)
+                    st.session_state.arrears_results = None
+                else:
+                    st.error(message)
+
 def employee_management_page():
     # Get user ID from session state
     user_id = st.session_state.user_id
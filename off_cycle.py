@@ -0,0 +1,111 @@
+"""
+Off-cycle payroll runs for bonuses, thirteenth-month pay and arrears
+
+A one-off payment is not a month of salary, so it must not be annualised
+on its own. Its PAYE is the marginal tax it adds to the employee's regular
+annual income: annual tax on regular taxable pay plus the payment (with
+the consolidated relief recomputed on the larger gross) less the annual
+tax on regular taxable pay alone. Every employee in a run is worked out in
+one pass over arrays under the rules in force on the payment date.
+"""
+import numpy as np
+import pandas as pd
+
+from salary_calculator import round_money
+
+# Payment types accepted for an off-cycle run
+PAYMENT_TYPES = ['Bonus', 'Thirteenth Month', 'Arrears', 'Other']
+
+# Output column order for off-cycle results
+OFF_CYCLE_COLUMNS = [
+    'Account Number', 'STAFF ID', 'Email', 'NAME', 'DEPARTMENT', 'JOB TITLE',
+    'ANNUAL GROSS PAY', 'Contract Type', 'PAYMENT TYPE', 'ONE_OFF_AMOUNT',
+    'REGULAR_ANNUAL_TAXABLE', 'ANNUAL_TAXABLE_WITH_PAYMENT', 'ADDITIONAL_RELIEF',
+    'TAXABLE_PAYMENT', 'PAYE_TAX', 'NET_PAYMENT'
+]
+
+
+def calculate_marginal_paye(calculator, annual_gross, is_contract, voluntary_pension, amounts, rules=None):
+    """
+    Marginal PAYE on one-off payments, for arrays of employees.
+
+    Regular pay is the full-month pay for the annual gross, so proration in
+    the payment month does not change the tax on the lump sum.
+
+    Args:
+        calculator (SalaryCalculator): Calculator with the employees' components
+        annual_gross (np.ndarray): Regular annual gross pay
+        is_contract (np.ndarray): True for CONTRACT staff
+        voluntary_pension (np.ndarray): Monthly voluntary pension
+        amounts (np.ndarray): One-off payment per employee
+        rules (StatutoryRules, optional): Rule version, the current rules by default
+
+    Returns:
+        dict: Result arrays for the output columns from REGULAR_ANNUAL_TAXABLE on
+    """
+    rules = rules or calculator.rules
+    zeros = np.zeros_like(annual_gross)
+    regular = calculator.calculate_columns(
+        annual_gross, np.ones_like(annual_gross), is_contract, voluntary_pension, zeros, zeros, rules
+    )
+
+    # Annual gross after pension, the base for consolidated relief
+    adjusted_gross = 12 * (regular['PRORATED_MONTHLY_GROSS'] - regular['MANDATORY_PENSION']
+                           - regular['VOLUNTARY_PENSION'])
+    regular_taxable = round_money(12 * regular['TAXABLE_PAY'])
+
+    # Relief grows with the payment: its percentage share plus any rise in the minimum relief
+    def annual_relief(gross):
+        return rules.cra_percent_rate * gross + np.maximum(rules.cra_minimum_rate * gross, rules.cra_annual_floor)
+
+    additional_relief = round_money(annual_relief(adjusted_gross + amounts) - annual_relief(adjusted_gross))
+
+    taxable_payment = round_money(np.maximum(amounts - additional_relief, 0.0))
+    taxable_with_payment = round_money(regular_taxable + taxable_payment)
+
+    table = rules.tax_table
+    paye_tax = round_money(table.annual_tax_array(taxable_with_payment) - table.annual_tax_array(regular_taxable))
+
+    return {
+        'REGULAR_ANNUAL_TAXABLE': regular_taxable,
+        'ANNUAL_TAXABLE_WITH_PAYMENT': taxable_with_payment,
+        'ADDITIONAL_RELIEF': additional_relief,
+        'TAXABLE_PAYMENT': taxable_payment,
+        'PAYE_TAX': paye_tax,
+        'NET_PAYMENT': round_money(amounts - paye_tax),
+    }
+
+
+def calculate_off_cycle(calculator, payments, payment_date):
+    """
+    Calculate an off-cycle run of one-off payments.
+
+    Args:
+        calculator (SalaryCalculator): Calculator with the employees' components
+        payments (pd.DataFrame): One row per payment with 'ANNUAL GROSS PAY',
+            'Contract Type', 'ONE_OFF_AMOUNT' and optionally 'PAYMENT TYPE',
+            'VOLUNTARY_PENSION' and the identity columns
+        payment_date (str or date): Date paid; selects the rule version
+
+    Returns:
+        pd.DataFrame: Results in OFF_CYCLE_COLUMNS order
+    """
+    amounts = payments['ONE_OFF_AMOUNT'].to_numpy(dtype=float)
+    if (amounts < 0).any():
+        raise ValueError("One-off amounts cannot be negative")
+
+    columns = calculate_marginal_paye(
+        calculator,
+        payments['ANNUAL GROSS PAY'].to_numpy(dtype=float),
+        calculator._contract_mask(payments['Contract Type']),
+        calculator._numeric_column(payments, 'VOLUNTARY_PENSION'),
+        round_money(amounts),
+        calculator.rule_book.for_date(payment_date)
+    )
+
+    result = {column: payments[column].to_numpy() for column in OFF_CYCLE_COLUMNS if column in payments.columns}
+    result['PAYMENT TYPE'] = (payments['PAYMENT TYPE'].to_numpy() if 'PAYMENT TYPE' in payments.columns
+                              else np.full(len(payments), PAYMENT_TYPES[0], dtype=object))
+    result['ONE_OFF_AMOUNT'] = round_money(amounts)
+    result.update(columns)
+    return pd.DataFrame(result, columns=OFF_CYCLE_COLUMNS)
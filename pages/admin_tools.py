@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
-from database import get_all_employees, delete_employee
+from database import get_employee_by_id, delete_employee, get_statutory_rules, save_statutory_rules
+from pages.employee_management import paginate_employees
+from calculation_cache import shared_cache
+from salary_calculator import STAGE_TIMINGS
 
 def render_page():
     """Admin tools page for direct database operations"""
@@ -14,14 +17,12 @@ def render_page():
     with st.expander("Employee Management", expanded=True):
         st.subheader("Delete Employee")
         
-        # Get all employees for this user
-        employees = get_all_employees(user_id)
+        # Get the visible page of employees for this user
+        df, total = paginate_employees(user_id, "admin_employees")
         
-        if not employees:
+        if not total:
             st.info("No employees found")
         else:
-            # Convert to DataFrame for display
-            df = pd.DataFrame(employees)
             st.dataframe(df[['id', 'staff_id', 'full_name', 'department']])
             
             # Direct employee deletion
@@ -35,7 +36,7 @@ def render_page():
                 if st.button("Delete Now", type="primary"):
                     if employee_id:
                         # Confirm employee exists first
-                        employee_exists = any(emp['id'] == employee_id for emp in employees)
+                        employee_exists = get_employee_by_id(employee_id, user_id) is not None
                         
                         if not employee_exists:
                             st.error(f"No employee found with ID {employee_id}")
@@ -49,4 +50,102 @@ def render_page():
                                 else:
                                     st.error(f"Failed to delete employee: {message}")
                     else:
-                        st.error("Please enter an employee ID")
\ No newline at end of file
+                        st.error("Please enter an employee ID")
+
+    with st.expander("Calculation Cache"):
+        st.subheader("Salary Calculation Cache")
+        st.write("Payroll calculations are reused when an employee's pay inputs have not changed.")
+
+        stats = shared_cache().stats()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Hits", f"{stats['hits']:,}")
+        col2.metric("Misses", f"{stats['misses']:,}")
+        col3.metric("Hit Rate", f"{stats['hit_rate'] * 100:.1f}%")
+        st.caption(f"{stats['size']:,} of {stats['max_entries']:,} entries in use")
+
+        if st.button("Clear Cache"):
+            shared_cache().clear()
+            st.rerun()
+
+    with st.expander("Calculation Timings"):
+        st.subheader("Per-Stage Calculation Timings")
+        st.write("Time spent in each stage of the salary calculation since timings were last reset. "
+                 "Runs split across worker processes are not included.")
+
+        STAGE_TIMINGS.enabled = st.checkbox("Record stage timings", value=STAGE_TIMINGS.enabled)
+
+        timings = STAGE_TIMINGS.to_dataframe()
+        if timings['calls'].sum():
+            timings['seconds'] = timings['seconds'].round(4)
+            timings['share'] = (timings['share'] * 100).round(1)
+            st.dataframe(timings.rename(columns={
+                'calls': 'Calls', 'rows': 'Rows', 'seconds': 'Seconds', 'share': 'Share %'
+            }))
+        else:
+            st.info("No timings recorded yet. Enable recording and run a calculation.")
+
+        if st.button("Reset Timings"):
+            STAGE_TIMINGS.reset()
+            st.rerun()
+
+    with st.expander("Statutory Rules"):
+        st.subheader("Statutory Rule Versions")
+        st.write("Each pay period is calculated with the latest rules effective on or before its end date.")
+
+        versions = get_statutory_rules()
+        if versions:
+            st.dataframe(pd.DataFrame([
+                {
+                    'Effective From': version['effective_from'],
+                    'PAYE Bands': ', '.join(
+                        f"{rate * 100:g}%" + ("" if width == float('inf') else f" on ₦{width:,.0f}")
+                        for width, rate in version['tax_bands']
+                    ),
+                    'Employee Pension': f"{version['employee_pension_rate'] * 100:g}%",
+                    'Employer Pension': f"{version['employer_pension_rate'] * 100:g}%",
+                    'Pension Threshold': f"₦{version['pension_threshold']:,.0f}",
+                    'CRA': f"{version['cra_percent_rate'] * 100:g}% + max({version['cra_minimum_rate'] * 100:g}%, ₦{version['cra_annual_floor']:,.0f})"
+                }
+                for version in versions
+            ]))
+
+        st.subheader("Add Rule Version")
+        latest = versions[-1] if versions else None
+        if latest:
+            with st.form("statutory_rules_form"):
+                effective_from = st.date_input("Effective From")
+                bands_text = st.text_area(
+                    "PAYE Bands (one 'band width, rate %' per line; leave the last width blank)",
+                    value='\n'.join(
+                        f"{'' if width == float('inf') else f'{width:.0f}'}, {rate * 100:g}"
+                        for width, rate in latest['tax_bands']
+                    )
+                )
+                col1, col2, col3 = st.columns(3)
+                employee_rate = col1.number_input("Employee Pension %", value=latest['employee_pension_rate'] * 100)
+                employer_rate = col2.number_input("Employer Pension %", value=latest['employer_pension_rate'] * 100)
+                threshold = col3.number_input("Pension Threshold (₦ monthly)", value=latest['pension_threshold'])
+                col1, col2, col3 = st.columns(3)
+                cra_rate = col1.number_input("CRA %", value=latest['cra_percent_rate'] * 100)
+                cra_minimum = col2.number_input("CRA Minimum %", value=latest['cra_minimum_rate'] * 100)
+                cra_floor = col3.number_input("CRA Annual Floor (₦)", value=latest['cra_annual_floor'])
+
+                if st.form_submit_button("Save Rule Version"):
+                    try:
+                        bands = []
+                        for line in filter(None, map(str.strip, bands_text.splitlines())):
+                            width, rate = (part.strip() for part in line.split(','))
+                            bands.append((float(width) if width else float('inf'), float(rate) / 100))
+                    except ValueError:
+                        st.error("Each band must be written as 'band width, rate %'")
+                    else:
+                        success, message = save_statutory_rules(
+                            effective_from.strftime('%Y-%m-%d'), bands,
+                            employee_rate / 100, employer_rate / 100, threshold,
+                            cra_rate / 100, cra_minimum / 100, cra_floor
+                        )
+                        if success:
+                            st.success(message)
+                            st.rerun()
+                        else:
+                            st.error(message)
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from database import get_employee_by_id, add_employee
+from database import get_employee_by_id, add_employee, search_employees
 
 def render_page():
     # Get user ID from session state
@@ -9,7 +9,8 @@ def render_page():
     
     # Check if employee_id is in query parameters
     if not st.query_params.get("id"):
-        st.warning("No employee selected. Please select an employee from the employee list.")
+        st.warning("No employee selected. Search for an employee or select one from the employee list.")
+        employee_search(user_id)
         st.stop()
     
     # Get employee ID from query parameters
@@ -22,6 +23,9 @@ def render_page():
         st.error("Employee not found or you don't have permission to view this employee.")
         st.stop()
     
+    with st.expander("🔍 Find another employee"):
+        employee_search(user_id)
+
     # Display employee header
     st.subheader(f"{employee['full_name']} ({employee['staff_id']})")
     st.markdown(f"**Department:** {employee['department']} | **Position:** {employee['job_title']}")
@@ -35,6 +39,26 @@ def render_page():
     with edit_tab:
         edit_employee_details(employee)
 
+def employee_search(user_id):
+    """Search box listing matching employees, each opening that employee's details"""
+    search = st.text_input("Search employees", placeholder="Name, email, staff ID, department or job title")
+    if not search:
+        return
+
+    try:
+        matches = search_employees(user_id, search, limit=10)
+    except Exception as e:
+        st.error(f"Search failed: {str(e)}")
+        return
+    if not matches:
+        st.info("No employees match your search.")
+    for match in matches:
+        label = f"{match['full_name']} ({match['staff_id']}) · {match['department']}, {match['job_title']}"
+        if st.button(label, key=f"search_result_{match['id']}"):
+            st.query_params.id = match['id']
+            st.query_params.page = "employee_details"
+            st.rerun()
+
 def display_employee_details(employee):
     """Display all employee details in a well-formatted view"""
     
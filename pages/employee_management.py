@@ -2,9 +2,45 @@ import streamlit as st
 import pandas as pd
 import time
 from datetime import datetime
-from database import add_employee, get_all_employees, generate_staff_id, delete_employee
+from database import add_employee, generate_staff_id, delete_employee
+from database import query_employees, count_employees, get_employee_departments, search_employees
 from utils import validate_csv, process_bulk_upload, generate_csv_template
 
+# Employees shown per page of the employee list
+PAGE_SIZE = 50
+
+def paginate_employees(user_id, key, page_size=PAGE_SIZE, **filters):
+    """
+    Fetch the visible page of employees and show Previous/Next controls
+
+    The cursors of the pages visited are kept in session state under
+    ``key`` and reset whenever the filters change.
+
+    Returns:
+        tuple: (DataFrame of the page, total employees matching the filters)
+    """
+    cursors_key = f"{key}_cursors"
+    filters_key = f"{key}_filters"
+    if st.session_state.get(filters_key) != filters or cursors_key not in st.session_state:
+        st.session_state[cursors_key] = [None]
+        st.session_state[filters_key] = filters
+    cursors = st.session_state[cursors_key]
+
+    employees, next_cursor = query_employees(user_id, page_size, cursors[-1], **filters)
+    total = count_employees(user_id, **filters)
+
+    first = (len(cursors) - 1) * page_size
+    col1, col2, col3 = st.columns([1, 2, 1])
+    if col1.button("← Previous", disabled=len(cursors) == 1, key=f"{key}_previous"):
+        cursors.pop()
+        st.rerun()
+    col2.caption(f"Showing {first + 1 if employees else 0}–{first + len(employees)} of {total:,} employees")
+    if col3.button("Next →", disabled=next_cursor is None, key=f"{key}_next"):
+        cursors.append(next_cursor)
+        st.rerun()
+
+    return pd.DataFrame(employees), total
+
 def render_page():
     # Get user ID from session state
     user_id = st.session_state.user_id
@@ -104,18 +140,40 @@ def render_page():
 
     with tab2:
         st.subheader("Employee List")
-        employees = get_all_employees(user_id)
-        if employees:
-            # Convert to DataFrame
-            df = pd.DataFrame(employees)
-
-            # Add simple search
-            search = st.text_input("🔍 Search by name or department")
-            if search:
-                df = df[
-                    df['full_name'].str.contains(search, case=False, na=False) |
-                    df['department'].str.contains(search, case=False, na=False)
-                ]
+
+        # Filters are applied in the database, which returns only the visible page
+        col1, col2, col3, col4 = st.columns([2, 2, 2, 2])
+        search = col1.text_input("🔍 Search", placeholder="Name, email, staff ID, department or job title")
+        department = col2.selectbox("Department", ["All"] + get_employee_departments(user_id))
+        contract_type = col3.selectbox("Contract Type", ["All", "Full Time", "Contract"])
+        salary_range = col4.text_input("Annual gross (₦ min-max)", placeholder="e.g. 1000000-5000000")
+
+        min_salary = max_salary = None
+        if salary_range:
+            try:
+                low, _, high = salary_range.replace(',', '').partition('-')
+                min_salary = float(low) if low.strip() else None
+                max_salary = float(high) if high.strip() else None
+            except ValueError:
+                st.warning("Enter the salary range as min-max, e.g. 1000000-5000000")
+
+        filters = {
+            'department': None if department == "All" else department,
+            'contract_type': None if contract_type == "All" else contract_type,
+            'min_salary': min_salary,
+            'max_salary': max_salary
+        }
+        if search:
+            # Best full-text matches instead of the paged list
+            try:
+                df = pd.DataFrame(search_employees(user_id, search, PAGE_SIZE, **filters))
+                st.caption(f"{len(df)} best matches for \"{search}\"")
+            except Exception as e:
+                st.error(f"Search failed: {str(e)}")
+                df = pd.DataFrame()
+        else:
+            df, total = paginate_employees(user_id, "employee_list", **filters)
+        if not df.empty:
 
             # Display employee table with key information
             display_cols = ['id', 'staff_id', 'full_name', 'department', 'job_title', 'contract_type']
@@ -292,7 +350,7 @@ def render_page():
                 del st.session_state.delete_error_messages
 
         else:
-            st.info("No employees found in the system.")
+            st.info("No employees match your search." if search else "No employees found in the system.")
 
     with tab3:
         st.subheader("Bulk Upload")
@@ -0,0 +1,190 @@
+"""
+Query plan check for the queries in database.py
+
+Runs every database function against a scratch database, records each
+statement it executes and asks SQLite how it would run it. A lookup that
+reads a whole table, or sorts rows no index keeps in order, is reported,
+so a new query cannot quietly fall back to a full scan. Run from the project directory:
+
+    python query_plans.py
+
+It exits with status 1 when any query scans a table or sorts without an index.
+"""
+import os
+import re
+import tempfile
+
+import pandas as pd
+
+import database
+from calculation_trace import rules_to_dict
+from salary_calculator import DEFAULT_COMPONENTS
+from tax_rules import DEFAULT_RULES
+
+# Statements whose plans are checked; inserts, DDL and pragmas are skipped
+CHECKED_STATEMENTS = re.compile(r'^\s*(SELECT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+
+# Plan steps that read every row of a table without an index
+FULL_SCAN = re.compile(r'^SCAN (\S+)$')
+
+# Plan step for a sort no index provides
+SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+# Tables that are read in full by design
+SMALL_TABLES = {'statutory_rules', 'sqlite_master', 'sqlite_schema'}
+
+EXAMPLE_EMPLOYEE = {
+    'staff_id': 'EMP250001',
+    'email': 'ada@example.com',
+    'full_name': 'Ada Obi',
+    'department': 'Finance',
+    'job_title': 'Accountant',
+    'annual_gross_pay': 3600000.0,
+    'start_date': '2024-01-01',
+    'end_date': None,
+    'contract_type': 'Full Time',
+    'account_number': '0123456789'
+}
+
+
+def exercise_database():
+    """Call every public function in database.py once, in a sensible order."""
+    success, user_id = database.register_user('planner', 'planner@example.com', 'secret', 'Query Planner')
+    database.login_user('planner', 'secret')
+    database.get_user_by_id(user_id)
+
+    database.add_employee(EXAMPLE_EMPLOYEE, user_id)
+    database.add_employee(EXAMPLE_EMPLOYEE, user_id)
+    database.upsert_employees([(0, dict(EXAMPLE_EMPLOYEE, staff_id='EMP250002', email='obi@example.com'))], user_id)
+    employees = database.get_all_employees(user_id)
+    employee_id = employees[0]['id']
+    page, cursor = database.query_employees(user_id, 1)
+    database.query_employees(user_id, 1, cursor)
+    database.query_employees(user_id, 50, department='Finance', contract_type='Full Time',
+                             min_salary=1000000, max_salary=5000000, name_prefix='Ad')
+    database.count_employees(user_id, department='Finance')
+    database.get_employee_departments(user_id)
+    database.search_employees(user_id, 'ada fin', department='Finance')
+    database.get_employee_by_id(employee_id, user_id)
+    database.generate_staff_id(user_id)
+
+    database.create_payroll_period(user_id, 'January 2025', '2025-01-01', '2025-01-31')
+    period = database.get_active_payroll_period(user_id)
+    database.get_payroll_period_for_date(user_id, '2025-01-15')
+    success, run_id = database.create_payroll_run(user_id, period['id'])
+    database.save_payroll_details(run_id, {
+        'employee_id': employee_id, 'gross_pay': 300000.0, 'net_pay': 250000.0, 'basic_salary': 90000.0,
+        'housing': 60000.0, 'transport': 75000.0, 'utility': 45000.0, 'meal': 15000.0, 'clothing': 15000.0,
+        'pension_employee': 18000.0, 'pension_employer': 22500.0, 'pension_voluntary': 0.0,
+        'paye_tax': 32000.0, 'other_deductions': 0.0, 'reimbursements': 0.0
+    })
+    database.get_payroll_trace(run_id, employee_id)
+    success, saved_run_id = database.save_payroll_run(user_id, period['id'], pd.DataFrame({
+        'employee_id': [employee_id], 'PRORATED_MONTHLY_GROSS': [300000.0], 'NET_PAY': [250000.0],
+        'COMP_BASIC': [90000.0], 'COMP_HOUSING': [60000.0], 'COMP_TRANSPORT': [75000.0],
+        'COMP_UTILITY': [45000.0], 'COMP_MEAL': [15000.0], 'COMP_CLOTHING': [15000.0],
+        'MANDATORY_PENSION': [18000.0], 'EMPLOYER_PENSION': [22500.0], 'VOLUNTARY_PENSION': [0.0],
+        'PAYE_TAX': [32000.0], 'OTHER_DEDUCTIONS': [0.0], 'REIMBURSEMENTS': [0.0],
+        'ANNUAL GROSS PAY': [3600000.0], 'WORKING_DAYS_RATIO': [1.0], 'ARREARS_NET_PAY': [0.0]
+    }), pd.DataFrame({
+        'months_paid': [1], 'cumulative_gross': [300000.0], 'cumulative_relief': [78000.0],
+        'cumulative_taxable': [222000.0], 'cumulative_tax': [32000.0]
+    }, index=pd.Index([employee_id], name='employee_id')), 2025, rules_to_dict(DEFAULT_RULES), DEFAULT_COMPONENTS)
+    database.get_payroll_trace(saved_run_id, employee_id)
+    database.update_payroll_run_status(run_id, 'approved', user_id, 'planner')
+    database.update_payroll_run_status(run_id, 'rejected', user_id)
+
+    database.save_off_cycle_run(user_id, period['id'], pd.DataFrame({
+        'employee_id': [employee_id], 'PAYMENT TYPE': ['Bonus'], 'ONE_OFF_AMOUNT': [100000.0],
+        'PAYE_TAX': [21000.0], 'NET_PAYMENT': [79000.0]
+    }))
+
+    database.get_payroll_history(user_id, [employee_id], '2025-01-01')
+    database.save_payroll_arrears(user_id, pd.DataFrame({
+        'effective_date': ['2025-01-01'], 'new_annual_gross': [4200000.0], 'periods': [1],
+        'gross_pay': [50000.0], 'pension_employee': [3000.0], 'pension_employer': [3750.0],
+        'paye_tax': [9000.0], 'net_pay': [38000.0], 'taxable_pay': [40000.0]
+    }, index=pd.Index([employee_id], name='employee_id')))
+    database.get_pending_arrears(user_id)
+    database.mark_arrears_paid(user_id, run_id, [employee_id])
+
+    database.save_payroll_ytd(run_id, 2025, pd.DataFrame({
+        'months_paid': [1], 'cumulative_gross': [300000.0], 'cumulative_relief': [78000.0],
+        'cumulative_taxable': [222000.0], 'cumulative_tax': [32000.0]
+    }, index=pd.Index([employee_id], name='employee_id')))
+    database.get_payroll_ytd([employee_id], 2025)
+
+    database.get_statutory_rules()
+    database.delete_employee(employee_id, user_id)
+
+
+def capture_queries(exercise=exercise_database):
+    """
+    Run database functions on a scratch database and record their statements.
+
+    Returns:
+        tuple: (connection to the scratch database, distinct checked statements
+            in the order first run, with parameters filled in)
+    """
+    directory = tempfile.mkdtemp()
+    database.DATABASE_PATH = os.path.join(directory, 'payroll.db')
+    database.init_db()
+
+    statements = []
+    conn = database.get_connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        exercise()
+    finally:
+        conn.set_trace_callback(None)
+
+    checked = [sql for sql in dict.fromkeys(statements) if CHECKED_STATEMENTS.match(sql)]
+    return conn, checked
+
+
+def full_scans(conn, sql):
+    """Full table scans and unindexed sorts in a statement's EXPLAIN QUERY PLAN."""
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    scans = []
+    for step in plan:
+        match = FULL_SCAN.match(step[-1])
+        if (match and match.group(1) not in SMALL_TABLES) or step[-1] == SORT:
+            scans.append(step[-1])
+    return scans
+
+
+def check_query_plans(exercise=exercise_database):
+    """
+    Check that every statement run by database.py uses an index.
+
+    Returns:
+        list: (statement, offending plan steps) for each statement that scans
+            a table or sorts without an index
+    """
+    path = database.DATABASE_PATH
+    try:
+        conn, statements = capture_queries(exercise)
+        problems = []
+        for sql in statements:
+            scans = full_scans(conn, sql)
+            if scans:
+                problems.append((sql, scans))
+        database.close_connections()
+        return problems
+    finally:
+        database.DATABASE_PATH = path
+
+
+def main():
+    problems = check_query_plans()
+    for sql, scans in problems:
+        print(' '.join(sql.split()))
+        for scan in scans:
+            print(f"    {scan}")
+    if problems:
+        raise SystemExit(1)
+    print("All queries use an index")
+
+
+if __name__ == '__main__':
+    main()
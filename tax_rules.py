@@ -0,0 +1,221 @@
+"""
+Statutory PAYE tax tables for the salary calculator
+"""
+from bisect import bisect_right
+from functools import lru_cache
+
+import numpy as np
+
+from business_calendar import to_days
+
+# Bump whenever the bands or statutory rates change so cached results are invalidated
+TAX_RULES_VERSION = 1
+
+# Annual PAYE bands as (band width, rate)
+PAYE_TAX_BANDS = (
+    (300000, 0.07),
+    (300000, 0.11),
+    (500000, 0.15),
+    (500000, 0.19),
+    (1600000, 0.21),
+    (float('inf'), 0.24),
+)
+
+# Statutory rates in force before any stored rule change
+DEFAULT_EFFECTIVE_FROM = '2011-01-01'
+EMPLOYEE_PENSION_RATE = 0.08
+EMPLOYER_PENSION_RATE = 0.10
+PENSION_THRESHOLD = 30000
+CRA_PERCENT_RATE = 0.2
+CRA_MINIMUM_RATE = 0.01
+CRA_ANNUAL_FLOOR = 200000
+
+
+class TaxBandTable:
+    """
+    Progressive tax bands compiled to cumulative thresholds and tax.
+
+    Tax on an income is the cumulative tax of every band below it plus the
+    marginal rate on the part inside its own band, so a whole array of
+    incomes needs one ``searchsorted`` and one multiply-add.
+    """
+
+    def __init__(self, bands):
+        widths = [float(width) for width, _ in bands]
+        self.rates = np.array([float(rate) for _, rate in bands])
+
+        # Lower bound of each band and tax owed on everything below it
+        self.thresholds = np.concatenate(([0.0], np.cumsum(widths[:-1])))
+        self.cumulative_tax = np.concatenate(([0.0], np.cumsum(np.multiply(widths[:-1], self.rates[:-1]))))
+
+        # Plain lists for fast single-value lookups
+        self._threshold_list = self.thresholds.tolist()
+        self._rate_list = self.rates.tolist()
+        self._cumulative_list = self.cumulative_tax.tolist()
+        self._kobo_schedule = None
+
+    def annual_tax(self, annual_taxable):
+        """Tax due on a single annual taxable income."""
+        if annual_taxable <= 0:
+            return 0.0
+        band = bisect_right(self._threshold_list, annual_taxable) - 1
+        return self._cumulative_list[band] + (annual_taxable - self._threshold_list[band]) * self._rate_list[band]
+
+    def kobo_schedule(self):
+        """
+        Integer form of the table for fixed-point calculation.
+
+        Returns lower thresholds in kobo, rates in basis points and cumulative
+        tax in kobo scaled by 10,000, so tax stays an exact integer until the
+        caller's final rounding.
+        """
+        if self._kobo_schedule is None:
+            thresholds = np.rint(self.thresholds * 100).astype(np.int64)
+            rates = np.rint(self.rates * 10000).astype(np.int64)
+            widths = np.diff(thresholds)
+            cumulative_tax = np.concatenate(([0], np.cumsum(widths * rates[:-1]))).astype(np.int64)
+            self._kobo_schedule = (thresholds, rates, cumulative_tax)
+        return self._kobo_schedule
+
+    def annual_tax_array(self, annual_taxable):
+        """Tax due on an array of annual taxable incomes."""
+        income = np.maximum(np.asarray(annual_taxable, dtype=float), 0.0)
+        band = np.searchsorted(self.thresholds, income, side='right') - 1
+        return self.cumulative_tax[band] + (income - self.thresholds[band]) * self.rates[band]
+
+
+@lru_cache(maxsize=None)
+def compile_tax_bands(bands=PAYE_TAX_BANDS):
+    """Compile a band schedule once and share the table between calculators."""
+    return TaxBandTable(bands)
+
+
+class StatutoryRules:
+    """
+    One version of the statutory payroll rules, compiled and immutable.
+
+    Built through ``compile_rules`` so each distinct version is compiled once
+    and shared by every calculator that uses it.
+    """
+    __slots__ = (
+        'effective_from', 'tax_bands', 'employee_pension_rate', 'employer_pension_rate',
+        'pension_threshold', 'cra_percent_rate', 'cra_minimum_rate', 'cra_annual_floor',
+        'tax_table'
+    )
+
+    def __init__(self, effective_from, tax_bands, employee_pension_rate, employer_pension_rate,
+                 pension_threshold, cra_percent_rate, cra_minimum_rate, cra_annual_floor):
+        values = {
+            'effective_from': effective_from,
+            'tax_bands': tax_bands,
+            'employee_pension_rate': employee_pension_rate,
+            'employer_pension_rate': employer_pension_rate,
+            'pension_threshold': pension_threshold,
+            'cra_percent_rate': cra_percent_rate,
+            'cra_minimum_rate': cra_minimum_rate,
+            'cra_annual_floor': cra_annual_floor,
+            'tax_table': compile_tax_bands(tax_bands),
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return compile_rules, self.key()
+
+    def __repr__(self):
+        return f"StatutoryRules(effective_from={self.effective_from!r})"
+
+    def key(self):
+        """The defining values of this version, in constructor order."""
+        return (
+            self.effective_from, self.tax_bands, self.employee_pension_rate,
+            self.employer_pension_rate, self.pension_threshold, self.cra_percent_rate,
+            self.cra_minimum_rate, self.cra_annual_floor
+        )
+
+    def replace(self, **changes):
+        """Compile a copy of this version with some values changed."""
+        values = dict(zip(StatutoryRules.__slots__, self.key()))
+        values.update(changes)
+        return compile_rules(**values)
+
+
+@lru_cache(maxsize=None)
+def _compile_rules(effective_from, tax_bands, employee_pension_rate, employer_pension_rate,
+                   pension_threshold, cra_percent_rate, cra_minimum_rate, cra_annual_floor):
+    return StatutoryRules(
+        effective_from, tax_bands, employee_pension_rate, employer_pension_rate,
+        pension_threshold, cra_percent_rate, cra_minimum_rate, cra_annual_floor
+    )
+
+
+def compile_rules(effective_from=DEFAULT_EFFECTIVE_FROM, tax_bands=PAYE_TAX_BANDS,
+                  employee_pension_rate=EMPLOYEE_PENSION_RATE, employer_pension_rate=EMPLOYER_PENSION_RATE,
+                  pension_threshold=PENSION_THRESHOLD, cra_percent_rate=CRA_PERCENT_RATE,
+                  cra_minimum_rate=CRA_MINIMUM_RATE, cra_annual_floor=CRA_ANNUAL_FLOOR):
+    """Compile a rule version, returning the shared object for identical values."""
+    return _compile_rules(
+        str(effective_from),
+        tuple((float(width), float(rate)) for width, rate in tax_bands),
+        float(employee_pension_rate), float(employer_pension_rate),
+        float(pension_threshold), float(cra_percent_rate),
+        float(cra_minimum_rate), float(cra_annual_floor)
+    )
+
+
+class RuleBook:
+    """
+    Effective-dated rule versions, looked up by pay period.
+
+    A period is paid under the latest version effective on or before its
+    date; periods before the first version use the first version.
+    """
+
+    def __init__(self, versions):
+        self.versions = tuple(sorted(versions, key=lambda rules: rules.effective_from))
+        if not self.versions:
+            raise ValueError("A rule book needs at least one rule version")
+        self.effective_days = to_days([rules.effective_from for rules in self.versions])
+        self.latest = self.versions[-1]
+
+    def version_indices(self, dates):
+        """Index into ``versions`` of the rules in force for each date."""
+        return np.maximum(np.searchsorted(self.effective_days, to_days(dates), side='right') - 1, 0)
+
+    def for_date(self, pay_date):
+        """Rules in force for a single pay period date."""
+        return self.versions[int(self.version_indices(pay_date)[0])]
+
+    def fingerprint(self):
+        """Values of every version, for keying cached results."""
+        return [rules.key() for rules in self.versions]
+
+
+DEFAULT_RULES = compile_rules()
+DEFAULT_RULE_BOOK = RuleBook([DEFAULT_RULES])
+
+
+def rule_book_from_records(records):
+    """
+    Compile stored rule versions into a rule book.
+
+    Args:
+        records (list): Rule rows as returned by get_statutory_rules
+
+    Returns:
+        RuleBook: The compiled versions, or the built-in rules when none are stored
+    """
+    if not records:
+        return DEFAULT_RULE_BOOK
+    return RuleBook([
+        compile_rules(
+            record['effective_from'], record['tax_bands'],
+            record['employee_pension_rate'], record['employer_pension_rate'],
+            record['pension_threshold'], record['cra_percent_rate'],
+            record['cra_minimum_rate'], record['cra_annual_floor']
+        )
+        for record in records
+    ])
@@ -1,7 +1,7 @@
 import pandas as pd
 import io
 from datetime import datetime, timedelta
-from database import add_employee
+from database import upsert_employees
 
 def validate_csv(df):
     """Validate uploaded CSV structure and data types with enhanced error reporting."""
@@ -89,45 +89,48 @@ def process_bulk_upload(df, user_id):
             'errors': validation_result['errors']
         }
 
+    def employee_rows():
+        for index, row in zip(df.index, df.to_dict('records')):
+            try:
+                yield index, {
+                    'staff_id': row['STAFF ID'],
+                    'email': row['Email'],
+                    'full_name': row['NAME'],
+                    'department': row['DEPARTMENT'],
+                    'job_title': row['JOB TITLE'],
+                    'annual_gross_pay': float(row['ANNUAL GROSS PAY']),
+                    'start_date': row['START DATE'].strftime('%Y-%m-%d'),
+                    'end_date': row['END DATE'].strftime('%Y-%m-%d') if pd.notna(row['END DATE']) else None,
+                    'contract_type': row['Contract Type'],
+                    'reimbursements': float(row.get('Reimbursements', 0)),
+                    'other_deductions': float(row.get('Other Deductions', 0)),
+                    'voluntary_pension': float(row.get('VOLUNTARY_PENSION', 0)),
+                    'account_number': str(row['Account Number'])
+                }
+            except Exception as e:
+                row_errors.append((index, f"Unexpected error - {str(e)}"))
+
+    # Rows are converted here and written in a single transaction
+    row_errors = []
+    success, saved = upsert_employees(employee_rows(), user_id)
+    if not success:
+        return {
+            'success': False,
+            'processed': 0,
+            'errors': [saved],
+            'updated': 0,
+            'added': 0,
+            'message': saved
+        }
+
     results = {
         'success': True,
-        'processed': 0,
-        'errors': [],
-        'updated': 0,
-        'added': 0
+        'processed': saved['added'] + saved['updated'],
+        'errors': [f"Row {index + 2}: {message}" for index, message in sorted(row_errors + saved['errors'])],
+        'updated': saved['updated'],
+        'added': saved['added']
     }
 
-    for index, row in df.iterrows():
-        try:
-            employee_data = {
-                'staff_id': row['STAFF ID'],
-                'email': row['Email'],
-                'full_name': row['NAME'],
-                'department': row['DEPARTMENT'],
-                'job_title': row['JOB TITLE'],
-                'annual_gross_pay': float(row['ANNUAL GROSS PAY']),
-                'start_date': row['START DATE'].strftime('%Y-%m-%d'),
-                'end_date': row['END DATE'].strftime('%Y-%m-%d') if pd.notna(row['END DATE']) else None,
-                'contract_type': row['Contract Type'],
-                'reimbursements': float(row.get('Reimbursements', 0)),
-                'other_deductions': float(row.get('Other Deductions', 0)),
-                'voluntary_pension': float(row.get('VOLUNTARY_PENSION', 0)),
-                'account_number': str(row['Account Number'])
-            }
-
-            success, message = add_employee(employee_data, user_id)
-            if success:
-                results['processed'] += 1
-                if "updated" in message.lower():
-                    results['updated'] += 1
-                else:
-                    results['added'] += 1
-            else:
-                results['errors'].append(f"Row {index + 2}: {message}")
-
-        except Exception as e:
-            results['errors'].append(f"Row {index + 2}: Unexpected error - {str(e)}")
-
     if results['errors']:
         results['success'] = False
 
@@ -0,0 +1,77 @@
+"""
+Seeded synthetic workforces in the bulk upload CSV format
+"""
+import numpy as np
+import pandas as pd
+
+# Pay month used when none is given, fixed so a seed always gives the same rows
+DEFAULT_PAY_MONTH = '2025-01'
+
+DEPARTMENTS = ['Engineering', 'Design', 'Finance', 'Operations', 'Sales', 'Human Resources', 'Legal']
+JOB_TITLES = ['Analyst', 'Associate', 'Engineer', 'Manager', 'Officer', 'Specialist', 'Director']
+
+
+def generate_workforce(rows, seed=0, pay_month=DEFAULT_PAY_MONTH):
+    """
+    Generate a reproducible workforce matching utils.generate_csv_template.
+
+    The mix follows a typical month-end payroll: about 85% full-time staff,
+    about 8% joiners and 4% leavers prorated within the month, a quarter
+    paying voluntary pension, and log-normal salaries from the pension
+    threshold up to the top tax band.
+
+    Args:
+        rows (int): Number of employees
+        seed (int, optional): Random seed; the same seed gives the same workforce
+        pay_month (str, optional): Month being paid, as YYYY-MM
+
+    Returns:
+        pd.DataFrame: Employees with the bulk upload columns
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, rows + 1)
+
+    # Dates cover the period paid: the whole month unless joining or leaving mid-month
+    month_start = np.datetime64(pay_month, 'M').astype('datetime64[D]')
+    month_end = (np.datetime64(pay_month, 'M') + 1).astype('datetime64[D]') - 1
+    days_in_month = (month_end - month_start).astype(int) + 1
+    mover = rng.random(rows)
+    joiner = mover < 0.08
+    leaver = (mover >= 0.08) & (mover < 0.12)
+    start_dates = np.where(
+        joiner,
+        month_start + rng.integers(0, days_in_month, rows),
+        month_start
+    )
+    end_dates = np.where(leaver, month_start + rng.integers(0, days_in_month, rows), month_end)
+    end_dates = np.maximum(start_dates, end_dates)
+
+    # Pay: log-normal around ₦3.6m a year, some amounts with kobo
+    annual_gross = np.clip(rng.lognormal(np.log(3600000), 0.9, rows), 360000, 120000000)
+    annual_gross = np.where(rng.random(rows) < 0.7, np.round(annual_gross, -3), np.round(annual_gross, 2))
+
+    is_contract = rng.random(rows) < 0.15
+    voluntary_pension = np.where(
+        ~is_contract & (rng.random(rows) < 0.25),
+        np.round(annual_gross / 12 * rng.uniform(0.01, 0.05, rows), 2),
+        0.0
+    )
+    reimbursements = np.where(rng.random(rows) < 0.3, np.round(rng.uniform(5000, 100000, rows), -2), 0.0)
+    other_deductions = np.where(rng.random(rows) < 0.2, np.round(rng.uniform(1000, 50000, rows), -2), 0.0)
+
+    staff_ids = np.char.add(np.where(is_contract, 'CON', 'EMP'), np.char.zfill(ids.astype(str), 6))
+    return pd.DataFrame({
+        'Account Number': np.char.zfill(rng.integers(0, 10**10, rows).astype(str), 10),
+        'STAFF ID': staff_ids,
+        'Email': np.char.add(np.char.lower(staff_ids), '@company.com'),
+        'NAME': np.char.add('Employee ', ids.astype(str)),
+        'DEPARTMENT': rng.choice(DEPARTMENTS, rows),
+        'JOB TITLE': rng.choice(JOB_TITLES, rows),
+        'ANNUAL GROSS PAY': annual_gross,
+        'START DATE': np.datetime_as_string(start_dates, unit='D'),
+        'END DATE': np.datetime_as_string(end_dates, unit='D'),
+        'Contract Type': np.where(is_contract, 'Contract', 'Full Time'),
+        'Reimbursements': reimbursements,
+        'Other Deductions': other_deductions,
+        'VOLUNTARY_PENSION': voluntary_pension
+    })
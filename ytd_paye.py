@@ -0,0 +1,164 @@
+"""
+Cumulative year-to-date PAYE across payroll periods
+
+Instead of annualising each month on its own, PAYE for period ``p`` of the
+tax year is the tax on year-to-date taxable pay with every band scaled to
+``p/12`` of its annual width, less the tax already deducted this year. Only
+the running totals are needed, so each new month costs O(1) per employee
+and mid-year joiners, pay changes and leavers are taxed on what they
+actually earned.
+
+Employees paid before running totals were kept have none stored, and
+starting them from zero would under-tax them for the rest of the year, so
+they stay on annualised PAYE until the next tax year.
+"""
+import numpy as np
+import pandas as pd
+
+from business_calendar import to_days
+from salary_calculator import round_money
+
+# Running totals kept per employee and tax year
+YTD_FIELDS = [
+    'months_paid',
+    'cumulative_gross',
+    'cumulative_relief',
+    'cumulative_taxable',
+    'cumulative_tax',
+]
+
+
+def empty_ytd(employee_ids):
+    """Zero running totals for employees with no pay yet this tax year."""
+    ytd = pd.DataFrame(0.0, index=pd.Index(employee_ids, name='employee_id'), columns=YTD_FIELDS)
+    ytd['months_paid'] = 0
+    return ytd
+
+
+def ytd_frame(employee_ids, records):
+    """
+    Align stored running totals with a list of employees.
+
+    Args:
+        employee_ids (list): Employees in the order of the payroll results
+        records (dict): employee_id -> stored totals, as from get_payroll_ytd
+
+    Returns:
+        pd.DataFrame: One row per employee with YTD_FIELDS, zeros where missing
+    """
+    ytd = empty_ytd(employee_ids)
+    for employee_id, record in records.items():
+        if employee_id in ytd.index:
+            ytd.loc[employee_id, YTD_FIELDS] = [record[field] for field in YTD_FIELDS]
+    return ytd
+
+
+def opening_totals_known(employee_ids, records, start_dates, period_start, period_number):
+    """
+    Which employees' running totals before a period are known.
+
+    They are known when stored for the tax year, when the period is the
+    first of the tax year, or when the employee starts in the period or
+    later, so nothing can have been paid to them earlier in the year.
+
+    Args:
+        employee_ids (list): Employees in the order of the payroll results
+        records (dict): employee_id -> stored totals, as from get_payroll_ytd
+        start_dates (array-like): Each employee's employment start date
+        period_start (str or date): First day of the period being paid
+        period_number (int): Month of the tax year being paid, 1-12
+
+    Returns:
+        np.ndarray: True where cumulative PAYE can be used
+    """
+    stored = np.array([employee_id in records for employee_id in employee_ids], dtype=bool)
+    starts_in_period = to_days(start_dates) >= to_days(period_start)[0]
+    return stored | starts_in_period | (period_number == 1)
+
+
+def calculate_cumulative_paye(tax_table, taxable_pay, period_number, previous_taxable,
+                              previous_tax, allow_refunds=False):
+    """
+    PAYE due this period from year-to-date totals.
+
+    Args:
+        tax_table (TaxBandTable): Compiled annual bands
+        taxable_pay (np.ndarray): This period's taxable pay
+        period_number (int or np.ndarray): Month of the tax year, 1-12
+        previous_taxable (np.ndarray): Taxable pay before this period
+        previous_tax (np.ndarray): Tax deducted before this period
+        allow_refunds (bool, optional): Return negative tax when the year to
+            date has been over-deducted, instead of zero
+
+    Returns:
+        np.ndarray: Tax to deduct this period
+    """
+    period_number = np.asarray(period_number, dtype=float)
+    ytd_taxable = previous_taxable + taxable_pay
+
+    # Bands scale linearly, so tax on p/12-width bands is p/12 of the
+    # annual tax on the year-to-date income annualised over p months
+    ytd_tax_due = tax_table.annual_tax_array(ytd_taxable * 12 / period_number) * period_number / 12
+    tax_this_period = round_money(ytd_tax_due - previous_tax)
+
+    if not allow_refunds:
+        tax_this_period = np.maximum(tax_this_period, 0.0)
+    return tax_this_period
+
+
+def apply_ytd_paye(calculator, results, ytd, period_number, period_end, allow_refunds=False,
+                   cumulative=None):
+    """
+    Replace annualised PAYE in calculator results with cumulative PAYE.
+
+    Args:
+        calculator (SalaryCalculator): Calculator that produced the results
+        results (pd.DataFrame): Output of process_dataframe for this period
+        ytd (pd.DataFrame): Running totals aligned row for row with results
+        period_number (int): Month of the tax year being paid, 1-12
+        period_end (str or date): Last day of the period; selects the rule version
+        allow_refunds (bool, optional): Allow negative PAYE refunds
+        cumulative (np.ndarray, optional): True for rows to tax cumulatively,
+            as from opening_totals_known; other rows keep annualised PAYE.
+            Every row by default
+
+    Returns:
+        tuple: (results with PAYE, deductions and net pay updated and the
+                TAX_PERIOD, PREVIOUS_TAXABLE and PREVIOUS_TAX it was worked
+                out from, empty on annualised rows; running totals after
+                this period for the cumulative rows)
+    """
+    previous = {field: ytd[field].to_numpy(dtype=float) for field in YTD_FIELDS}
+    taxable_pay = results['TAXABLE_PAY'].to_numpy(dtype=float)
+    cumulative = np.ones(len(results), dtype=bool) if cumulative is None else np.asarray(cumulative, dtype=bool)
+
+    paye_tax = np.where(cumulative, calculate_cumulative_paye(
+        calculator.rule_book.for_date(period_end).tax_table, taxable_pay, period_number,
+        previous['cumulative_taxable'], previous['cumulative_tax'], allow_refunds
+    ), results['PAYE_TAX'].to_numpy(dtype=float))
+
+    adjusted = results.copy()
+    adjusted['PAYE_TAX'] = paye_tax
+    adjusted['TAX_PERIOD'] = np.where(cumulative, period_number, np.nan)
+    adjusted['PREVIOUS_TAXABLE'] = np.where(cumulative, previous['cumulative_taxable'], np.nan)
+    adjusted['PREVIOUS_TAX'] = np.where(cumulative, previous['cumulative_tax'], np.nan)
+    adjusted['TOTAL_DEDUCTIONS'] = round_money(
+        paye_tax + adjusted['MANDATORY_PENSION'].to_numpy(dtype=float)
+        + adjusted['VOLUNTARY_PENSION'].to_numpy(dtype=float)
+        + adjusted['OTHER_DEDUCTIONS'].to_numpy(dtype=float)
+    )
+    adjusted['NET_PAY'] = round_money(
+        adjusted['PRORATED_MONTHLY_GROSS'].to_numpy(dtype=float)
+        - adjusted['TOTAL_DEDUCTIONS'].to_numpy(dtype=float)
+        + adjusted['REIMBURSEMENTS'].to_numpy(dtype=float)
+    )
+
+    updated = pd.DataFrame({
+        'months_paid': ytd['months_paid'].to_numpy(dtype=np.int64) + 1,
+        'cumulative_gross': round_money(previous['cumulative_gross'] + adjusted['PRORATED_MONTHLY_GROSS'].to_numpy(dtype=float)),
+        'cumulative_relief': round_money(previous['cumulative_relief'] + adjusted['TAX_RELIEF'].to_numpy(dtype=float)),
+        'cumulative_taxable': round_money(previous['cumulative_taxable'] + taxable_pay),
+        'cumulative_tax': round_money(previous['cumulative_tax'] + paye_tax),
+    }, index=ytd.index)
+
+    return adjusted, updated[cumulative]